@@ -1,3 +1,6 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timezone, timedelta
@@ -7,30 +10,68 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.models.users import User as UserModel
-from app.config import SECRET_KEY, ALGORITHM
+from app.schemas import UserResponse
+from app.cache import create_cache
+from app.config import SECRET_KEY, ALGORITHM, settings
 from app.db_depends import get_async_db
 
 
-# Создаём контекст для хеширования с использованием bcrypt
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+# Создаём контекст для хеширования с использованием bcrypt.
+# min/max_rounds равны текущей стоимости, поэтому хеши с другой стоимостью
+# считаются устаревшими и перехешируются при входе.
+pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto',
+                           bcrypt__rounds=settings.BCRYPT_ROUNDS,
+                           bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+                           bcrypt__max_rounds=settings.BCRYPT_ROUNDS)
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7  # 7 дней
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='users/token')
 
+# Кэш проверенных активных пользователей (id, email, role, is_active) по id.
+# In-process кэш не сбрасывается в других воркерах, поэтому живёт коротко
+principal_cache = create_cache(
+    "auth:principal",
+    ttl=settings.PRINCIPAL_CACHE_TTL if settings.CACHE_BACKEND == "redis" else settings.PRINCIPAL_CACHE_MEMORY_TTL,
+    maxsize=10_000,
+)
+
 
-def hash_password(password: str) -> str:
+class PasswordHasher:
     """
-    Преобразует пароль в хеш с использованием bcrypt.
+    Асинхронное хеширование паролей: bcrypt выполняется в ограниченном пуле потоков
+    (bcrypt отпускает GIL), а семафор ограничивает число одновременных операций,
+    чтобы всплеск входов не занял все потоки и не блокировал цикл событий.
     """
-    return pwd_context.hash(password)
 
+    def __init__(self, context: CryptContext, max_workers: int, max_concurrency: int):
+        self.context = context
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(self, func, *args):
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        Проверяет пароль. Вторым значением возвращает новый хеш, если сохранённый
+        был создан с другой стоимостью bcrypt, иначе None.
+        """
+        return await self._run(self.context.verify_and_update, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(pwd_context,
+                                 max_workers=settings.PASSWORD_HASH_WORKERS,
+                                 max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """
-    Проверяет, соответствует ли введённый пароль сохранённому хешу.
-    """
-    return pwd_context.verify(plain_password, hashed_password)
 
 def create_access_token(data: dict):
     """
@@ -51,10 +92,18 @@ def create_refresh_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+async def invalidate_principal(user_id: int) -> None:
+    """
+    Удаляет пользователя из кэша (например, после деактивации).
+    """
+    await principal_cache.delete(str(user_id))
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme),
-                           db: AsyncSession = Depends(get_async_db)):
+                           db: AsyncSession = Depends(get_async_db)) -> UserResponse:
     """
-    Проверяет JWT и возвращает пользователя из базы.
+    Проверяет JWT и возвращает активного пользователя.
+    Пользователь берётся из кэша по id из токена; в базу запрос идёт только при промахе.
     """
     crendentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                            detail="Could not validate credentials",
@@ -63,6 +112,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme),
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
+        user_id: int | None = payload.get("id")
         if email is None:
             raise crendentials_exception
     except jwt.ExpiredSignatureError:
@@ -72,13 +122,27 @@ async def get_current_user(token: str = Depends(oauth2_scheme),
                             )
     except jwt.PyJWTError:
         raise crendentials_exception
-    result = await db.scalars(select(UserModel).where(UserModel.email == email, UserModel.is_active == True))
+
+    if user_id is not None:
+        cached = await principal_cache.get(str(user_id))
+        if cached is not None:
+            if cached["email"] != email:
+                raise crendentials_exception
+            return UserResponse.model_validate(cached)
+        stmt = select(UserModel).where(UserModel.id == user_id, UserModel.is_active == True)
+    else:
+        # Старые токены без id — ищем по email
+        stmt = select(UserModel).where(UserModel.email == email, UserModel.is_active == True)
+
+    result = await db.scalars(stmt)
     user = result.first()
-    if user is None:
+    if user is None or user.email != email:
         raise crendentials_exception
-    return user
+    principal = UserResponse.model_validate(user)
+    await principal_cache.set(str(user.id), principal.model_dump(mode="json"))
+    return principal
 
-def get_current_seller(current_user: UserModel = Depends(get_current_user)):
+def get_current_seller(current_user: UserResponse = Depends(get_current_user)):
     """
     Проверяет, что пользователь имеет роль 'seller'.
     """
@@ -88,7 +152,7 @@ def get_current_seller(current_user: UserModel = Depends(get_current_user)):
                             )
     return current_user
 
-def get_current_buyer(current_user: UserModel = Depends(get_current_user)):
+def get_current_buyer(current_user: UserResponse = Depends(get_current_user)):
     """
     Проверяет, что пользователь имеет роль 'seller'.
     """
@@ -98,7 +162,7 @@ def get_current_buyer(current_user: UserModel = Depends(get_current_user)):
                             )
     return current_user
 
-def get_current_admin(current_user: UserModel = Depends(get_current_user)):
+def get_current_admin(current_user: UserResponse = Depends(get_current_user)):
     """
     Проверяет, что пользователь имеет роль 'seller'.
     """
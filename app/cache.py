@@ -0,0 +1,168 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any
+
+from loguru import logger
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.config import CACHE_BACKEND, REDIS_URL
+
+
+class InMemoryCache:
+    """
+    Простой in-process кэш с вытеснением по LRU и временем жизни записей (TTL).
+    Интерфейс асинхронный, чтобы его можно было заменить внешним хранилищем.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Any | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """
+        Возвращает найденные значения по списку ключей (промахи пропускаются).
+        """
+        found = {}
+        for key in keys:
+            value = await self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    async def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def clear(self) -> None:
+        self._data.clear()
+
+    async def close(self) -> None:
+        self._data.clear()
+
+
+class RedisCache:
+    """
+    Кэш в Redis с тем же интерфейсом, что и InMemoryCache.
+    Значения хранятся в JSON, ключи — с префиксом пространства имён.
+    Ошибки Redis не роняют запрос: они логируются и считаются промахом кэша.
+    """
+
+    def __init__(self, client: aioredis.Redis, namespace: str, ttl: float = 60):
+        self.client = client
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Any | None:
+        try:
+            raw = await self.client.get(self._key(key))
+        except RedisError as e:
+            logger.warning({"event": "cache_error", "operation": "get", "error": str(e)})
+            return None
+        return None if raw is None else json.loads(raw)
+
+    async def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """
+        Возвращает найденные значения по списку ключей одним MGET (промахи пропускаются).
+        """
+        if not keys:
+            return {}
+        try:
+            raws = await self.client.mget([self._key(key) for key in keys])
+        except RedisError as e:
+            logger.warning({"event": "cache_error", "operation": "mget", "error": str(e)})
+            return {}
+        return {key: json.loads(raw) for key, raw in zip(keys, raws) if raw is not None}
+
+    async def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        expire = self.ttl if ttl is None else ttl
+        try:
+            await self.client.set(self._key(key), json.dumps(value, default=str), px=int(expire * 1000))
+        except RedisError as e:
+            logger.warning({"event": "cache_error", "operation": "set", "error": str(e)})
+
+    async def delete(self, *keys: str) -> None:
+        if not keys:
+            return
+        try:
+            await self.client.delete(*(self._key(key) for key in keys))
+        except RedisError as e:
+            logger.warning({"event": "cache_error", "operation": "delete", "error": str(e)})
+
+    async def clear(self) -> None:
+        try:
+            async for key in self.client.scan_iter(match=self._key("*")):
+                await self.client.delete(key)
+        except RedisError as e:
+            logger.warning({"event": "cache_error", "operation": "clear", "error": str(e)})
+
+    async def close(self) -> None:
+        # Клиент общий для всех пространств имён и закрывается через close_redis_client()
+        pass
+
+
+_redis_client: aioredis.Redis | None = None
+# Все кэши, созданные через create_cache, — чтобы закрыть их при остановке приложения
+_caches: list["InMemoryCache | RedisCache"] = []
+
+
+def get_redis_client() -> aioredis.Redis:
+    """
+    Возвращает общий клиент Redis (тот же сервер, что используется брокером Celery).
+    """
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = aioredis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+async def close_redis_client() -> None:
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
+
+
+def create_cache(namespace: str, ttl: float = 60, maxsize: int = 1024) -> InMemoryCache | RedisCache:
+    """
+    Создаёт кэш с бэкендом, выбранным в настройке CACHE_BACKEND ("memory" или "redis").
+    """
+    if CACHE_BACKEND == "redis":
+        cache = RedisCache(get_redis_client(), namespace=namespace, ttl=ttl)
+    else:
+        cache = InMemoryCache(maxsize=maxsize, ttl=ttl)
+    _caches.append(cache)
+    return cache
+
+
+async def close_all_caches() -> None:
+    """
+    Освобождает все кэши: in-process очищаются, общий клиент Redis закрывается.
+    Данные в Redis не удаляются — ими пользуются другие воркеры.
+    """
+    for cache in _caches:
+        await cache.close()
+    await close_redis_client()
@@ -0,0 +1,262 @@
+"""
+Хранилище корзин в Redis с отложенной записью в cart_items (write-behind).
+
+Корзина пользователя — хеш cart:{user_id} (product_id -> quantity) в том же Redis,
+что используется брокером Celery. Чтение и изменение корзины не обращаются к
+cart_items: при первом обращении корзина загружается из базы, а изменённые корзины
+попадают в множество cart:dirty и периодически сбрасываются в базу
+(фоновым циклом в приложении или задачей Celery flush_carts).
+Перед оформлением заказа корзина пользователя сбрасывается принудительно.
+
+Включается настройкой CART_BACKEND=redis.
+"""
+import asyncio
+from decimal import Decimal
+from typing import Any
+
+from loguru import logger
+from redis import asyncio as aioredis
+from redis.exceptions import LockError
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker as AsyncSessionMaker
+
+from app.cache import get_redis_client
+from app.catalog_cache import product_cache
+from app.config import settings
+from app.models.cart_items import CartItem as CartItemModel
+from app.models.products import Product as ProductModel, PRODUCT_RESPONSE_COLUMNS
+
+
+# Служебное поле хеша: отличает загруженную пустую корзину от отсутствующей в Redis
+_LOADED_FIELD = "_loaded"
+DIRTY_KEY = "cart:dirty"
+# Время жизни блокировки сброса корзины и сколько ждать её при оформлении заказа (секунды)
+_FLUSH_LOCK_TIMEOUT = 30
+_FLUSH_LOCK_WAIT = 10
+
+
+class RedisCartStore:
+    """
+    Корзины в Redis. id позиции корзины в ответах совпадает с id товара:
+    строки cart_items появляются только при сбросе в базу.
+    """
+
+    def __init__(self, client: aioredis.Redis, ttl: int = settings.CART_REDIS_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"cart:{user_id}"
+
+    async def _ensure_loaded(self, db: AsyncSession, user_id: int) -> None:
+        key = self._key(user_id)
+        if await self.client.exists(key):
+            return
+        rows = (await db.execute(
+            select(CartItemModel.product_id, CartItemModel.quantity).where(CartItemModel.user_id == user_id)
+        )).all()
+        # HSETNX не перезаписывает поля, изменённые параллельным запросом во время загрузки
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hsetnx(key, _LOADED_FIELD, 1)
+            for row in rows:
+                pipe.hsetnx(key, str(row.product_id), row.quantity)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def _write(self, user_id: int, commands: list[tuple[str, tuple]]) -> list:
+        """
+        Выполняет команды над хешем корзины одной транзакцией и помечает корзину изменённой.
+        Возвращает результаты команд.
+        """
+        key = self._key(user_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            for name, args in commands:
+                getattr(pipe, name)(key, *args)
+            pipe.expire(key, self.ttl)
+            pipe.sadd(DIRTY_KEY, user_id)
+            results = await pipe.execute()
+        return results[:len(commands)]
+
+    async def quantities(self, db: AsyncSession, user_id: int) -> dict[int, int]:
+        await self._ensure_loaded(db, user_id)
+        raw = await self.client.hgetall(self._key(user_id))
+        return {int(field): int(value) for field, value in raw.items() if field.decode() != _LOADED_FIELD}
+
+    async def add(self, db: AsyncSession, user_id: int, product_id: int, quantity: int) -> int:
+        await self._ensure_loaded(db, user_id)
+        results = await self._write(user_id, [("hincrby", (str(product_id), quantity))])
+        # Результат HINCRBY — новое количество
+        return int(results[0])
+
+    async def set(self, db: AsyncSession, user_id: int, product_id: int, quantity: int) -> bool:
+        """
+        Устанавливает количество товара, если он уже есть в корзине.
+        """
+        await self._ensure_loaded(db, user_id)
+        if not await self.client.hexists(self._key(user_id), str(product_id)):
+            return False
+        await self._write(user_id, [("hset", (str(product_id), quantity))])
+        return True
+
+    async def remove(self, db: AsyncSession, user_id: int, product_id: int) -> bool:
+        await self._ensure_loaded(db, user_id)
+        if not await self.client.hexists(self._key(user_id), str(product_id)):
+            return False
+        await self._write(user_id, [("hdel", (str(product_id),))])
+        return True
+
+    async def apply(self, db: AsyncSession, user_id: int, actions: dict[int, tuple[str, int]]) -> None:
+        """
+        Применяет итоговые действия пакетной операции (см. _collapse_operations) одной транзакцией Redis.
+        """
+        await self._ensure_loaded(db, user_id)
+        commands = []
+        for product_id, (action, quantity) in actions.items():
+            if action == "add":
+                commands.append(("hincrby", (str(product_id), quantity)))
+            elif action == "set":
+                commands.append(("hset", (str(product_id), quantity)))
+            else:
+                commands.append(("hdel", (str(product_id),)))
+        await self._write(user_id, commands)
+
+    async def clear(self, user_id: int) -> None:
+        key = self._key(user_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, _LOADED_FIELD, 1)
+            pipe.expire(key, self.ttl)
+            pipe.sadd(DIRTY_KEY, user_id)
+            await pipe.execute()
+
+    async def forget(self, user_id: int) -> None:
+        """
+        Убирает корзину из Redis без записи в базу (после оформления заказа).
+        """
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(user_id))
+            pipe.srem(DIRTY_KEY, user_id)
+            await pipe.execute()
+
+    async def render(self, db: AsyncSession, user_id: int) -> dict[str, Any]:
+        """
+        Собирает ответ CartResponse: товары берутся из кэша карточек,
+        недостающие — одним запросом IN; итоги считаются по этим данным.
+        """
+        quantities = await self.quantities(db, user_id)
+        # Все карточки одним обращением к кэшу (MGET для Redis)
+        cached = await product_cache.get_many([str(product_id) for product_id in quantities])
+        products: dict[int, dict[str, Any]] = {int(key): value for key, value in cached.items()}
+        missing = [product_id for product_id in quantities if product_id not in products]
+        if missing:
+            rows = (await db.execute(
+                select(*PRODUCT_RESPONSE_COLUMNS).where(ProductModel.id.in_(missing))
+            )).mappings().all()
+            products.update({row["id"]: dict(row) for row in rows})
+
+        items = []
+        total_quantity, total_price = 0, Decimal("0")
+        for product_id in sorted(quantities):
+            product = products.get(product_id)
+            if product is None:
+                continue
+            quantity = quantities[product_id]
+            items.append({"id": product_id, "quantity": quantity, "product": product})
+            total_quantity += quantity
+            total_price += Decimal(str(product["price"])) * quantity
+        return {"user_id": user_id, "items": items, "total_quantity": total_quantity, "total_price": total_price}
+
+    async def flush_user(self, db: AsyncSession, user_id: int, wait: bool = False) -> bool:
+        """
+        Записывает корзину пользователя из Redis в cart_items и фиксирует транзакцию.
+
+        Сброс одной корзины сериализован блокировкой в Redis (SET NX PX): иначе два
+        параллельных сброса (фоновый цикл, задача Celery, оформление заказа) могли бы
+        зафиксироваться в обратном порядке и оставить в базе более старый снимок.
+        Без wait при занятой блокировке возвращает False (корзину сбросит владелец
+        блокировки или следующий проход); с wait ждёт до _FLUSH_LOCK_WAIT секунд.
+        """
+        lock = self.client.lock(f"{self._key(user_id)}:flush", timeout=_FLUSH_LOCK_TIMEOUT,
+                                blocking=wait, blocking_timeout=_FLUSH_LOCK_WAIT)
+        if not await lock.acquire():
+            return False
+        try:
+            # Снимаем отметку до чтения: изменения во время сброса снова пометят корзину
+            await self.client.srem(DIRTY_KEY, user_id)
+            try:
+                raw = await self.client.hgetall(self._key(user_id))
+                if not raw:
+                    return True
+                quantities = {int(field): int(value) for field, value in raw.items()
+                              if field.decode() != _LOADED_FIELD}
+                await db.execute(
+                    delete(CartItemModel).where(CartItemModel.user_id == user_id,
+                                                CartItemModel.product_id.not_in(quantities))
+                )
+                if quantities:
+                    stmt = pg_insert(CartItemModel).values([
+                        {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+                        for product_id, quantity in quantities.items()
+                    ])
+                    await db.execute(stmt.on_conflict_do_update(
+                        constraint="uq_cart_items_user_product",
+                        set_={"quantity": stmt.excluded.quantity},
+                    ))
+                await db.commit()
+                return True
+            except BaseException:
+                await db.rollback()
+                await self.client.sadd(DIRTY_KEY, user_id)
+                raise
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                # Блокировка истекла раньше: сброс шёл дольше _FLUSH_LOCK_TIMEOUT
+                logger.warning({"event": "cart_flush_lock_expired", "user_id": user_id})
+
+    async def flush_dirty(self, sessionmaker: AsyncSessionMaker, batch_size: int = 100) -> int:
+        """
+        Сбрасывает в базу все изменённые корзины. Возвращает их количество.
+        Корзины, которые сейчас сбрасывает другой процесс, пропускаются.
+        """
+        flushed = 0
+        busy: set[int] = set()
+        while True:
+            user_ids = {int(user_id) for user_id in await self.client.srandmember(DIRTY_KEY, batch_size)}
+            # Остались только корзины, занятые другими процессами
+            if not user_ids - busy:
+                return flushed
+            async with sessionmaker() as db:
+                for user_id in user_ids - busy:
+                    if await self.flush_user(db, user_id):
+                        flushed += 1
+                    else:
+                        busy.add(user_id)
+
+
+async def run_flush_loop(store: RedisCartStore, sessionmaker: AsyncSessionMaker,
+                         interval: float = settings.CART_FLUSH_INTERVAL) -> None:
+    """
+    Фоновый цикл приложения: раз в interval секунд сбрасывает изменённые корзины в базу.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await store.flush_dirty(sessionmaker)
+        except Exception as e:
+            logger.error({"event": "cart_flush_failed", "error": str(e)})
+
+
+def create_cart_store() -> RedisCartStore | None:
+    """
+    Возвращает хранилище корзин в Redis, если выбрано CART_BACKEND=redis, иначе None (корзины в базе).
+    """
+    if settings.CART_BACKEND != "redis":
+        return None
+    return RedisCartStore(get_redis_client())
+
+
+cart_store = create_cart_store()
@@ -0,0 +1,64 @@
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import create_cache
+from app.config import CATALOG_CACHE_TTL
+from app.models.categories import Category as CategoryModel
+from app.models.products import Product as ProductModel
+from app.schemas import ProductResponse
+
+
+PRODUCT_CACHE_NAMESPACE = "catalog:product"
+
+# Кэш карточек активных товаров (ключ — id товара)
+product_cache = create_cache(PRODUCT_CACHE_NAMESPACE, ttl=CATALOG_CACHE_TTL, maxsize=10_000)
+# Кэш активных категорий (ключ — id категории, хранится только True)
+category_cache = create_cache("catalog:category", ttl=CATALOG_CACHE_TTL, maxsize=1_000)
+
+
+async def get_active_product(db: AsyncSession, product_id: int) -> dict[str, Any] | None:
+    """
+    Возвращает данные активного товара в виде словаря ProductResponse
+    (из кэша или из базы). None, если товар не найден или неактивен.
+    """
+    key = str(product_id)
+    cached = await product_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = await db.scalars(
+        select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True)
+    )
+    product = result.first()
+    if product is None:
+        return None
+    data = ProductResponse.model_validate(product).model_dump(mode="json")
+    await product_cache.set(key, data)
+    return data
+
+
+async def is_category_active(db: AsyncSession, category_id: int) -> bool:
+    """
+    Проверяет, что категория существует и активна (с кэшированием положительного ответа).
+    """
+    key = str(category_id)
+    if await category_cache.get(key):
+        return True
+
+    result = await db.scalars(
+        select(CategoryModel.id).where(CategoryModel.id == category_id, CategoryModel.is_active == True)
+    )
+    if result.first() is None:
+        return False
+    await category_cache.set(key, True)
+    return True
+
+
+async def invalidate_product(*product_ids: int) -> None:
+    await product_cache.delete(*(str(product_id) for product_id in product_ids))
+
+
+async def invalidate_category(category_id: int) -> None:
+    await category_cache.delete(str(category_id))
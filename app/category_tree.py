@@ -0,0 +1,81 @@
+from typing import Any
+
+from sqlalchemy import literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import InMemoryCache
+from app.config import CATALOG_CACHE_TTL
+from app.models.categories import Category as CategoryModel
+
+
+# Иерархия активных категорий в памяти процесса: одна запись со всеми узлами.
+# Сбрасывается в create/update/delete_category, TTL ограничивает расхождение между воркерами.
+hierarchy_cache = InMemoryCache(maxsize=1, ttl=CATALOG_CACHE_TTL)
+_HIERARCHY_KEY = "hierarchy"
+
+
+async def _load_hierarchy(db: AsyncSession) -> list[dict[str, Any]]:
+    """
+    Загружает дерево активных категорий одним рекурсивным CTE.
+    Обход идёт от активных корней вниз только по активным категориям,
+    поэтому отключённая категория скрывает всё своё поддерево.
+    """
+    tree = (
+        select(CategoryModel.id, CategoryModel.name, CategoryModel.parent_id, literal(0).label("depth"))
+        .where(CategoryModel.parent_id.is_(None), CategoryModel.is_active == True)
+        .cte("category_tree", recursive=True)
+    )
+    tree = tree.union_all(
+        select(CategoryModel.id, CategoryModel.name, CategoryModel.parent_id, (tree.c.depth + 1).label("depth"))
+        .join(tree, CategoryModel.parent_id == tree.c.id)
+        .where(CategoryModel.is_active == True)
+    )
+    result = await db.execute(select(tree).order_by(tree.c.depth, tree.c.name, tree.c.id))
+    return [dict(row) for row in result.mappings()]
+
+
+async def _get_hierarchy(db: AsyncSession) -> list[dict[str, Any]]:
+    rows = await hierarchy_cache.get(_HIERARCHY_KEY)
+    if rows is None:
+        rows = await _load_hierarchy(db)
+        await hierarchy_cache.set(_HIERARCHY_KEY, rows)
+    return rows
+
+
+async def get_category_tree(db: AsyncSession) -> list[dict[str, Any]]:
+    """
+    Возвращает активные категории в виде вложенного дерева (список корней с children).
+    """
+    nodes = {row["id"]: {**row, "children": []} for row in await _get_hierarchy(db)}
+    roots = []
+    # Строки упорядочены по глубине, поэтому родитель всегда уже в nodes
+    for node in nodes.values():
+        if node["parent_id"] is None:
+            roots.append(node)
+        else:
+            nodes[node["parent_id"]]["children"].append(node)
+    return roots
+
+
+async def get_descendant_ids(db: AsyncSession, category_id: int) -> list[int] | None:
+    """
+    Возвращает id категории и всех её активных потомков.
+    None, если категория не входит в дерево активных категорий.
+    """
+    children: dict[int, list[int]] = {}
+    known = set()
+    for row in await _get_hierarchy(db):
+        known.add(row["id"])
+        if row["parent_id"] is not None:
+            children.setdefault(row["parent_id"], []).append(row["id"])
+    if category_id not in known:
+        return None
+
+    ids = [category_id]
+    for current in ids:
+        ids.extend(children.get(current, ()))
+    return ids
+
+
+async def invalidate_category_tree() -> None:
+    await hierarchy_cache.clear()
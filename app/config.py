@@ -1,6 +1,96 @@
-import os
-from dotenv import load_dotenv
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = "HS256"
\ No newline at end of file
+
+class Settings(BaseSettings):
+    """
+    Настройки приложения. Значения читаются из переменных окружения и файла .env.
+    """
+    SECRET_KEY: str | None = None
+    ALGORITHM: str = "HS256"
+
+    # Хеширование паролей: стоимость bcrypt, размер пула потоков и лимит одновременных операций
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 8
+    # Время жизни кэша проверенных пользователей (секунды), ключ — id пользователя.
+    # При CACHE_BACKEND=redis кэш общий и деактивация сбрасывает его сразу во всех воркерах.
+    # С in-process кэшем сброс виден только обработавшему её воркеру, остальные могут
+    # пускать пользователя ещё до PRINCIPAL_CACHE_MEMORY_TTL секунд (0 — не кэшировать)
+    PRINCIPAL_CACHE_TTL: float = 60
+    PRINCIPAL_CACHE_MEMORY_TTL: float = 5
+
+    # Подключение к базе данных и пул соединений
+    DATABASE_URL: str = "postgresql+asyncpg://ecommerce_user:qwerty@db:5432/ecommerce_db"
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    # Размер кэша подготовленных выражений asyncpg на соединение (0 — отключить)
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    # Сколько соединений открыть и прогреть при старте приложения
+    DB_POOL_WARM_SIZE: int = 2
+
+    # Redis: брокер Celery и (опционально) бэкенд кэша
+    REDIS_URL: str = "redis://127.0.0.1:6379/0"
+    # Брокер и бэкенд результатов Celery (по умолчанию — REDIS_URL)
+    CELERY_BROKER_URL: str | None = None
+    # Выполнять задачи сразу в текущем процессе, без брокера (для тестов и локального запуска)
+    CELERY_TASK_ALWAYS_EAGER: bool = False
+    # Задержка демонстрационной задачи GET / (секунды); в режиме eager не применяется
+    BACKGROUND_TASK_DELAY: float = 10
+    # Бэкенд кэша приложения: "memory" (in-process LRU+TTL) или "redis"
+    CACHE_BACKEND: str = "memory"
+    # Время жизни кэша карточек товаров и статусов категорий (секунды)
+    CATALOG_CACHE_TTL: float = 60
+    # Время жизни кэша общего количества товаров в листинге (секунды)
+    PRODUCT_COUNT_CACHE_TTL: float = 5
+    # Сколько самых популярных товаров положить в кэш при старте
+    CACHE_PRIME_TOP_PRODUCTS: int = 100
+
+    # Хранилище корзин: "sql" (таблица cart_items) или "redis" (Redis с отложенной записью в cart_items)
+    CART_BACKEND: str = "sql"
+    # Время жизни корзины в Redis без обращений (секунды) и период сброса изменённых корзин в базу
+    CART_REDIS_TTL: int = 7 * 24 * 3600
+    CART_FLUSH_INTERVAL: float = 5
+    # Период страховочного сброса корзин задачей Celery beat (секунды)
+    CART_FLUSH_BEAT_INTERVAL: float = 60
+
+    # Массовый импорт товаров: строк в одной пачке (одна транзакция) и максимум ошибок в отчёте
+    IMPORT_BATCH_SIZE: int = 1000
+    IMPORT_MAX_REPORTED_ERRORS: int = 1000
+    # Производные изображений товаров: имя варианта -> максимальная ширина (px) и качество WebP/JPEG
+    IMAGE_VARIANT_WIDTHS: dict[str, int] = {"thumb": 160, "card": 480, "large": 1200}
+    IMAGE_QUALITY: int = 80
+    # Раздача /media: время кэширования в браузере и CDN (секунды); файлы не перезаписываются
+    MEDIA_CACHE_MAX_AGE: int = 31536000
+    # Отдавать файлы через прокси: "X-Accel-Redirect" (nginx) или "X-Sendfile" (Apache, lighttpd); None — сам воркер
+    MEDIA_OFFLOAD_HEADER: str | None = None
+    # Префикс internal-location в nginx для X-Accel-Redirect
+    MEDIA_ACCEL_PREFIX: str = "/internal-media/"
+    # Выгрузка каталога: строк, читаемых с серверного курсора за один раз
+    EXPORT_BATCH_SIZE: int = 1000
+
+    # Логирование запросов
+    LOG_LEVEL: str = "INFO"
+    # Писать логи через очередь и фоновый поток (по умолчанию — синхронно). Выигрыш возможен,
+    # когда stderr медленный (блокирующий pipe, сетевой сборщик); на быстром stderr очередь
+    # стоит не меньше синхронной записи (см. benchmarks/logging_overhead.py)
+    LOG_ENQUEUE: bool = False
+    # Доля успешных (status < 400) запросов, попадающих в лог: 1.0 — все, 0 — ни одного
+    LOG_SUCCESS_SAMPLE_RATE: float = 1.0
+    # Заголовок с идентификатором запроса (берётся из входящего запроса или генерируется)
+    REQUEST_ID_HEADER: str = "X-Request-ID"
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+settings = Settings()
+
+SECRET_KEY = settings.SECRET_KEY
+ALGORITHM = settings.ALGORITHM
+REDIS_URL = settings.REDIS_URL
+CACHE_BACKEND = settings.CACHE_BACKEND
+CATALOG_CACHE_TTL = settings.CATALOG_CACHE_TTL
+PRODUCT_COUNT_CACHE_TTL = settings.PRODUCT_COUNT_CACHE_TTL
@@ -16,14 +16,130 @@ from sqlalchemy.orm import sessionmaker, DeclarativeBase
 # SessionLocal = sessionmaker(bind=engine)
 
 # --------------- Асинхронное подключение к PostgreSQL -------------------------
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker, AsyncEngine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import Settings, settings
+
+
+class PoolMetrics:
+    """
+    Счётчики пула соединений: выдачи, возвраты, новые соединения и время ожидания
+    свободного соединения. Нужны, чтобы подбирать размер пула и число воркеров
+    под max_connections PostgreSQL.
+    """
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.max_checked_out = 0
+        self.wait_count = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self._checked_out = 0
+
+    def attach(self, engine: AsyncEngine) -> None:
+        pool = engine.sync_engine.pool
+
+        @event.listens_for(pool, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            self.connects += 1
+
+        @event.listens_for(pool, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self.checkouts += 1
+            self._checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self._checked_out)
+
+        @event.listens_for(pool, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            self.checkins += 1
+            self._checked_out = max(self._checked_out - 1, 0)
+
+        @event.listens_for(pool, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self.invalidations += 1
+
+    def observe_wait(self, started_at: float) -> None:
+        """
+        Учитывает время получения соединения из пула (от started_at из time.perf_counter()).
+        """
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        self.wait_count += 1
+        self.wait_total_ms += elapsed_ms
+        self.wait_max_ms = max(self.wait_max_ms, elapsed_ms)
+
+    def snapshot(self, engine: AsyncEngine) -> dict:
+        pool = engine.sync_engine.pool
+        snapshot = {
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "invalidations": self.invalidations,
+            "checked_out": self._checked_out,
+            "max_checked_out": self.max_checked_out,
+            "wait_count": self.wait_count,
+            "wait_avg_ms": round(self.wait_total_ms / self.wait_count, 3) if self.wait_count else 0.0,
+            "wait_max_ms": round(self.wait_max_ms, 3),
+        }
+        # QueuePool дополнительно сообщает размер и переполнение
+        for name in ("size", "overflow", "checkedin"):
+            if hasattr(pool, name):
+                snapshot[f"pool_{name}"] = getattr(pool, name)()
+        return snapshot
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeasuredQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который замеряет время получения соединения (ожидание
+    свободного соединения и открытие нового). Сессии остаются ленивыми:
+    соединение берётся из пула только при первом запросе к базе.
+    """
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_metrics.observe_wait(started_at)
+
+
+def create_engine_from_settings(config: Settings) -> AsyncEngine:
+    """
+    Создаёт асинхронный Engine с параметрами пула из настроек.
+    """
+    url = make_url(config.DATABASE_URL)
+    if url.get_driver_name() == "asyncpg":
+        url = url.update_query_dict(
+            {"prepared_statement_cache_size": str(config.DB_PREPARED_STATEMENT_CACHE_SIZE)}
+        )
+    return create_async_engine(
+        url,
+        echo=config.DB_ECHO,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+        poolclass=MeasuredQueuePool,
+    )
+
 
 # Строка подключения для PostgreSQl
-DATABASE_URL = "postgresql+asyncpg://ecommerce_user:qwerty@db:5432/ecommerce_db"
+DATABASE_URL = settings.DATABASE_URL
 
 # Создаём Engine
-async_engine = create_async_engine(DATABASE_URL, echo=True)
+async_engine = create_engine_from_settings(settings)
+pool_metrics.attach(async_engine)
 
 # Настраиваем фабрику сеансов
 async_sessionmaker = async_sessionmaker(async_engine, expire_on_commit=False, class_=AsyncSession)
@@ -31,4 +147,3 @@ async_sessionmaker = async_sessionmaker(async_engine, expire_on_commit=False, cl
 # Определяем базовый класс для моделей
 class Base(DeclarativeBase):
     pass
-
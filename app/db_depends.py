@@ -1,22 +1,3 @@
-from sqlalchemy.orm import Session
-from collections.abc import Generator
-
-from app.database import SessionLocal
-
-
-def get_db() -> Generator[Session, None, None]:
-    """
-    Зависимость для получения сессии базы данных.
-    Создаёт новую сессию для каждого запроса и закрывает её после обработки.
-    """
-    db: Session = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-
 # --------------- Асинхронная сессия -------------------------
 
 from collections.abc import AsyncGenerator
@@ -24,9 +5,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import async_sessionmaker
 
 
-async def get_aыsync_db() -> AsyncGenerator[AsyncSession, None]:
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     """
     Предоставляет асинхронную сессию SQLAlchemy для работы с базой данных PostgreSQL.
+    Сессия ленивая: соединение берётся из пула при первом запросе, время ожидания
+    учитывает сам пул (см. MeasuredQueuePool).
     """
     async with async_sessionmaker() as session:
         yield session
@@ -0,0 +1,140 @@
+"""
+Производные изображений товаров: уменьшенные копии в WebP и JPEG.
+
+Генерация идёт вне запроса — задачей Celery, а если брокер недоступен,
+в пуле потоков текущего процесса. Имена файлов содержат хеш содержимого,
+поэтому их можно отдавать с долгим кэшированием.
+"""
+import asyncio
+import contextlib
+import hashlib
+import io
+from pathlib import Path
+from typing import Any
+
+import aiofiles.os
+from loguru import logger
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.products import Product as ProductModel
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MEDIA_ROOT = BASE_DIR / "media" / "product"
+MEDIA_URL = "/media/product"
+
+# Ссылки на фоновые задачи запасного режима, чтобы их не собрал сборщик мусора
+_background_tasks: set[asyncio.Task] = set()
+
+
+def media_path(url: str) -> Path:
+    """
+    Путь к файлу на диске по его URL в /media.
+    """
+    return BASE_DIR / url.lstrip("/")
+
+
+def _encode(image, image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        image.convert("RGB").save(buffer, "JPEG", quality=settings.IMAGE_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, "WEBP", quality=settings.IMAGE_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def build_variants(image_url: str) -> dict[str, dict[str, Any]]:
+    """
+    Создаёт уменьшенные копии исходного изображения для каждой ширины из
+    IMAGE_VARIANT_WIDTHS (без увеличения) и возвращает их описание для image_variants.
+    Синхронная и CPU-ёмкая: вызывать в воркере Celery или в пуле потоков.
+    """
+    # Pillow нужен только здесь, поэтому импортируется лениво
+    from PIL import Image, ImageOps
+
+    source = media_path(image_url)
+    variants: dict[str, dict[str, Any]] = {}
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ("RGB", "RGBA"):
+            original = original.convert("RGBA" if "transparency" in original.info else "RGB")
+        for name, width in settings.IMAGE_VARIANT_WIDTHS.items():
+            image = original.copy()
+            image.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+            variant: dict[str, Any] = {"width": image.width, "height": image.height}
+            for key, image_format, extension in (("webp", "WEBP", "webp"), ("jpeg", "JPEG", "jpg")):
+                data = _encode(image, image_format)
+                digest = hashlib.sha256(data).hexdigest()[:16]
+                file_name = f"{source.stem}-{name}-{digest}.{extension}"
+                target = source.with_name(file_name)
+                if not target.exists():
+                    target.write_bytes(data)
+                variant[key] = f"{MEDIA_URL}/{file_name}"
+            variants[name] = variant
+    return variants
+
+
+def variant_urls(variants: dict[str, dict[str, Any]] | None) -> list[str]:
+    if not variants:
+        return []
+    return [variant[key] for variant in variants.values() for key in ("webp", "jpeg") if variant.get(key)]
+
+
+async def remove_variant_files(variants: dict[str, dict[str, Any]] | None) -> None:
+    """
+    Удаляет файлы производных изображений.
+    """
+    for url in variant_urls(variants):
+        with contextlib.suppress(FileNotFoundError):
+            await aiofiles.os.remove(media_path(url))
+
+
+async def store_variants(db: AsyncSession, product_id: int, image_url: str,
+                         variants: dict[str, dict[str, Any]]) -> bool:
+    """
+    Сохраняет image_variants товара, если его изображение не сменилось за время генерации.
+    Иначе удаляет уже ненужные файлы и возвращает False.
+    """
+    result = await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == product_id, ProductModel.image_url == image_url)
+        .values(image_variants=variants)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if result.rowcount:
+        return True
+    await remove_variant_files(variants)
+    return False
+
+
+async def _generate_in_process(product_id: int, image_url: str) -> None:
+    from app.catalog_cache import invalidate_product
+    from app.database import async_sessionmaker
+
+    try:
+        variants = await asyncio.to_thread(build_variants, image_url)
+        async with async_sessionmaker() as db:
+            if await store_variants(db, product_id, image_url, variants):
+                await invalidate_product(product_id)
+    except Exception as e:
+        logger.error({"event": "image_variants_failed", "product_id": product_id, "error": str(e)})
+
+
+async def schedule_image_variants(product_id: int, image_url: str) -> None:
+    """
+    Запускает генерацию производных изображения товара задачей Celery.
+    Если задачу поставить не удалось, генерирует их в фоне в текущем процессе.
+    """
+    from app.tasks import dispatch, generate_image_variants
+
+    try:
+        await dispatch(generate_image_variants, product_id, image_url)
+        return
+    except Exception as e:
+        logger.warning({"event": "image_variants_fallback", "product_id": product_id, "error": str(e)})
+    task = asyncio.create_task(_generate_in_process(product_id, image_url))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
@@ -1,4 +1,5 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from starlette.requests import Request
 from loguru import logger
 from app.routers import categories
@@ -7,69 +8,74 @@ from app.routers import users
 from app.routers import reviews
 from app.routers import cart
 from app.routers import orders
-from fastapi.staticfiles import StaticFiles
-import time
-from celery import Celery
-from app.database import DATABASE_URL
-from contextlib import asynccontextmanager
-import sys
+from app.media import MediaFiles
+from app.database import async_engine, async_sessionmaker, pool_metrics
+from app.config import settings
+from app.tasks import celery, call_background_task, dispatch  # celery — для `celery -A app.main.celery`
+from app.cache import close_all_caches
+from app.auth import password_hasher
+from app.warmup import warm_pool, prime_caches
+from app.request_logging import configure_logging, RequestLoggingMiddleware
+from app.cart_store import cart_store, run_flush_loop
+from contextlib import asynccontextmanager, suppress
+import asyncio
 
 
-# Глобальные переменные для хранения ресурсов
-db_connection_pool = DATABASE_URL
-ml_model = None
-
-logger.remove()
-
-logger.add(sys.stderr, format="{message}", serialize=True, level="INFO")
+configure_logging()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Код ДО yield: Выполняется при СТАРТЕ приложения
-    print("Приложение запускается: Инициализация ресурсов...")
-    global db_connection_pool
-    global ml_model
+    logger.info({"event": "startup", "message": "Инициализация ресурсов"})
+    app.state.db_ready = False
 
     try:
-    # Инициализация пула соединений с базой данных
-        db_connection_pool = {'status': 'connected','connection': 'ok'}
-        print(f"Пул соединений с базой данных {db_connection_pool} инициализирован.")
-    # Загрузка большой модели машинного обучения
-        ml_model = {'name': "AI-ML-Model", 'status': "loaded"}
-        print(f"Модель машинного обучения {ml_model} загружена.")
-
-    # Здесь можно запустить фоновые задачи, инициализировать кэши и т.д.
-        print("Ресурсы успешно инициализированы.")
-    # yield - это разделитель!
-    # Код после yield будет выполнен только при остановке приложения.
-        yield
-
+        # Открываем и прогреваем пул соединений, компилируем горячие запросы
+        await warm_pool(async_engine, settings.DB_POOL_WARM_SIZE)
+        # Заполняем кэши категорий и популярных товаров
+        async with async_sessionmaker() as session:
+            await prime_caches(session, settings.CACHE_PRIME_TOP_PRODUCTS)
+        app.state.db_ready = True
     except Exception as e:
-        print(f"Ошибка при инициализации ресурсов: {e}")
+        logger.error({"event": "startup_failed", "error": str(e)})
+        await close_all_caches()
+        await async_engine.dispose()
         # В случае ошибки при запуске, приложение не будет запущено
         raise # Перевыбрасываем исключение, чтобы сервер не стартовал
 
-    finally:
-    # Код ПОСЛЕ yield (или в finally блока): Выполняется при ОСТАНОВКЕ приложения
-        print("Приложение останавливается: Очистка ресурсов...")
-    if db_connection_pool:
-    # Закрытие пула соединений с БД
-        db_connection_pool = None
-        print("Пул соединений с базой данных закрыт.")
-    if ml_model:
-        ml_model = None
-        print("Модель машинного обучения выгружена.")
-
-
+    # Корзины в Redis периодически сбрасываются в базу
+    flush_task = None
+    if cart_store is not None:
+        flush_task = asyncio.create_task(run_flush_loop(cart_store, async_sessionmaker))
 
+    # yield - это разделитель!
+    # Код после yield будет выполнен только при остановке приложения.
+    try:
+        yield
+    finally:
+        # Код ПОСЛЕ yield: Выполняется при ОСТАНОВКЕ приложения
+        logger.info({"event": "shutdown", "message": "Очистка ресурсов"})
+        app.state.db_ready = False
+        if flush_task is not None:
+            flush_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await flush_task
+            # Последний сброс, чтобы не потерять изменения корзин
+            await cart_store.flush_dirty(async_sessionmaker)
+        password_hasher.shutdown()
+        await close_all_caches()
+        await async_engine.dispose()
+        logger.info({"event": "shutdown", "message": "Пул соединений с базой данных закрыт"})
 
 
 # Создаём приложение FastAPI
 app = FastAPI(
     title="FastAPI Интернет-магазин",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # JSON-ответы по умолчанию сериализуются orjson
+    default_response_class=ORJSONResponse,
 )
 
 # Подключаем маршруты категорий
@@ -79,48 +85,35 @@ app.include_router(users.router)
 app.include_router(reviews.router)
 app.include_router(cart.router)
 app.include_router(orders.router)
-app.mount("/media", StaticFiles(directory="media"), name='media')
+app.mount("/media", MediaFiles(directory="media"), name='media')
 
 
-celery = Celery(
-    __name__,
-    broker='redis://127.0.0.1:6379/0',
-    backend='redis://127.0.0.1:6379/0',
-    broker_connection_retry_on_startup=True,
-)
+app.add_middleware(RequestLoggingMiddleware)
 
-def call_background_task(message):
-    time.sleep(10)
-    print(f'Background task: called!')
-    print(message)
-
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = (time.time() - start_time) * 1000
-
-
-    # Используем логгер loguru
-    logger.info({
-        "event": "request",
-        "request_path": str(request.url.path),
-        # URL может быть сложным объектом, лучше преобразовать в строку
-        "method": request.method,
-        "status_code": response.status_code,
-        "process_time_ms": f"{process_time:.2f}"
-    })
-    return response
+@app.get("/metrics/db-pool")
+async def db_pool_metrics():
+    """
+    Метрики пула соединений с БД: выдачи, ожидание соединения, текущая загрузка.
+    """
+    return pool_metrics.snapshot(async_engine)
 
 @app.get("/")
-async def read_root(message: str, background_tasks: BackgroundTasks):
-    # Теперь мы можем использовать глобальные ресурсы
-    background_tasks.add_task(call_background_task, message)
-    if db_connection_pool and ml_model:
+async def read_root(message: str, request: Request):
+    # Задача выполняется воркером Celery, запрос не ждёт её завершения.
+    # В режиме eager она выполняется прямо в запросе, поэтому без задержки
+    delay = 0 if settings.CELERY_TASK_ALWAYS_EAGER else settings.BACKGROUND_TASK_DELAY
+    try:
+        task_id = (await dispatch(call_background_task, message, delay)).id
+    except Exception as e:
+        # Брокер недоступен — отвечаем без задачи, а не ошибкой 500
+        logger.warning({"event": "background_task_dispatch_failed", "error": str(e)})
+        task_id = None
+    if request.app.state.db_ready:
         return {
             "massage": "Hello, from fastapi!",
-            "db_status": db_connection_pool["status"],
-            "ml_status": ml_model["name"]
+            "db_status": "connected",
+            "task_id": task_id,
+            "task_status": "queued" if task_id else "unavailable",
         }
     return {"message": "Resources not available!"}
 
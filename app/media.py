@@ -0,0 +1,53 @@
+import os
+from urllib.parse import quote
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from app.config import Settings, settings
+
+
+class MediaFiles(StaticFiles):
+    """
+    Раздача загруженных файлов из /media.
+
+    Имена файлов уникальны (UUID или хеш содержимого) и никогда не перезаписываются,
+    поэтому ответы кэшируются надолго с пометкой immutable, а ETag строится по inode,
+    размеру и времени изменения. Запросы Range и If-Range обрабатывает FileResponse.
+    Если задан MEDIA_OFFLOAD_HEADER, тело ответа не отправляется: воркер возвращает только
+    заголовки, а файл отдаёт фронтовой прокси (nginx X-Accel-Redirect или X-Sendfile).
+    """
+
+    def __init__(self, *args, config: Settings = settings, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = f"public, max-age={config.MEDIA_CACHE_MAX_AGE}, immutable"
+        self.offload_header = config.MEDIA_OFFLOAD_HEADER
+        self.accel_prefix = config.MEDIA_ACCEL_PREFIX.rstrip("/") + "/"
+
+    @staticmethod
+    def etag_for(stat_result: os.stat_result) -> str:
+        return f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+    def _offload_target(self, full_path: str) -> str:
+        if self.offload_header.lower() == "x-accel-redirect":
+            relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+            return self.accel_prefix + quote(relative)
+        return os.path.abspath(full_path)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope,
+                      status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = {"etag": self.etag_for(stat_result), "cache-control": self.cache_control}
+
+        response = FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        if not self.offload_header:
+            return response
+
+        # Прокси сам отдаёт файл, в том числе по Range, и выставляет длину тела
+        offload_headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+        offload_headers[self.offload_header] = self._offload_target(str(full_path))
+        return Response(status_code=status_code, headers=offload_headers)
@@ -0,0 +1,34 @@
+"""Add product image_variants
+
+Revision ID: 49db560fdb0b
+Revises: aa4efde7ecf2
+Create Date: 2026-10-16 17:05:19.640213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '49db560fdb0b'
+down_revision: Union[str, Sequence[str], None] = 'aa4efde7ecf2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('image_variants', sa.JSON(), nullable=True))
+    # Файлы всегда сохранялись в media/product/, а URL указывал на /media/products/
+    op.execute("""
+        UPDATE products
+        SET image_url = replace(image_url, '/media/products/', '/media/product/')
+        WHERE image_url LIKE '/media/products/%'
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'image_variants')
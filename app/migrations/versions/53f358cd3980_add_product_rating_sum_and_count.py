@@ -0,0 +1,46 @@
+"""Add product rating_sum and rating_count
+
+Revision ID: 53f358cd3980
+Revises: dbac9c53c86a
+Create Date: 2026-10-16 15:20:47.261804
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '53f358cd3980'
+down_revision: Union[str, Sequence[str], None] = 'dbac9c53c86a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('rating_sum', sa.Numeric(precision=12, scale=2),
+                                        server_default=sa.text('0'), nullable=False))
+    op.add_column('products', sa.Column('rating_count', sa.Integer(),
+                                        server_default=sa.text('0'), nullable=False))
+    # Заполняем агрегаты по уже существующим активным отзывам
+    op.execute("""
+        UPDATE products
+        SET rating_sum = agg.grade_sum,
+            rating_count = agg.grade_count,
+            rating = round(agg.grade_sum / agg.grade_count, 1)
+        FROM (
+            SELECT product_id, sum(grade) AS grade_sum, count(*) AS grade_count
+            FROM reviews
+            WHERE is_active
+            GROUP BY product_id
+        ) AS agg
+        WHERE products.id = agg.product_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'rating_count')
+    op.drop_column('products', 'rating_sum')
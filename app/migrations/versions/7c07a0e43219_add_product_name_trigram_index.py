@@ -0,0 +1,29 @@
+"""Add product name trigram index
+
+Revision ID: 7c07a0e43219
+Revises: 3d768aed2206
+Create Date: 2026-10-16 10:12:40.118532
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c07a0e43219'
+down_revision: Union[str, Sequence[str], None] = '3d768aed2206'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_product_name_trgm', 'products', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_product_name_trgm', table_name='products', postgresql_using='gin')
@@ -0,0 +1,39 @@
+"""Add reviews listing indexes
+
+Revision ID: aa4efde7ecf2
+Revises: 53f358cd3980
+Create Date: 2026-10-16 15:48:32.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'aa4efde7ecf2'
+down_revision: Union[str, Sequence[str], None] = '53f358cd3980'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_reviews_product_id_comment_date', 'reviews',
+                    ['product_id', sa.text('comment_date DESC'), sa.text('id DESC')],
+                    unique=False, postgresql_where=sa.text('is_active'))
+    op.create_index('ix_reviews_product_id_grade', 'reviews',
+                    ['product_id', sa.text('grade DESC'), sa.text('id DESC')],
+                    unique=False, postgresql_where=sa.text('is_active'))
+    op.create_index('ix_reviews_comment_date', 'reviews',
+                    [sa.text('comment_date DESC'), sa.text('id DESC')],
+                    unique=False, postgresql_where=sa.text('is_active'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reviews_comment_date', table_name='reviews', postgresql_where=sa.text('is_active'))
+    op.drop_index('ix_reviews_product_id_grade', table_name='reviews', postgresql_where=sa.text('is_active'))
+    op.drop_index('ix_reviews_product_id_comment_date', table_name='reviews',
+                  postgresql_where=sa.text('is_active'))
@@ -0,0 +1,29 @@
+"""Add orders user_id, created_at index
+
+Revision ID: dbac9c53c86a
+Revises: 7c07a0e43219
+Create Date: 2026-10-16 14:02:11.503917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'dbac9c53c86a'
+down_revision: Union[str, Sequence[str], None] = '7c07a0e43219'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_orders_user_id_created_at', 'orders',
+                    ['user_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_user_id_created_at', table_name='orders')
@@ -25,6 +25,10 @@ class Category(Base):
                                                       )
 
 
-
-
-
+# Колонки, из которых собирается CategoryResponse
+CATEGORY_RESPONSE_COLUMNS = (
+    Category.id,
+    Category.name,
+    Category.parent_id,
+    Category.is_active,
+)
@@ -1,7 +1,7 @@
 from datetime import datetime
 from app.database import Base
 from decimal import Decimal
-from sqlalchemy import String, DateTime, func, ForeignKey, Numeric, Integer
+from sqlalchemy import String, DateTime, func, ForeignKey, Numeric, Integer, Index, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 class Order(Base):
@@ -20,6 +20,11 @@ class Order(Base):
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
 
+    __table_args__ = (
+        # Листинг заказов пользователя: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_orders_user_id_created_at", "user_id", text("created_at DESC"), text("id DESC")),
+    )
+
     user: Mapped["User"] = relationship("User", back_populates="orders")
     items: Mapped[list["OrderItem"]] = relationship(
         "OrderItem", back_populates="order", cascade="all, delete-orphan"
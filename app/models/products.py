@@ -1,4 +1,4 @@
-from sqlalchemy import String, Boolean, Integer, Numeric, ForeignKey, text, Computed, Index
+from sqlalchemy import String, Boolean, Integer, Numeric, ForeignKey, text, Computed, Index, JSON
 from decimal import Decimal
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import TSVECTOR
@@ -18,6 +18,8 @@ class Product(Base):
     description: Mapped[str | None] = mapped_column(String(500), nullable=True)
     price: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     image_url: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    # Производные изображения: {"thumb": {"width", "height", "webp", "jpeg"}, ...} (см. app/images.py)
+    image_variants: Mapped[dict | None] = mapped_column(JSON, nullable=True)
     stock: Mapped[int] = mapped_column(Integer, nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     review_id: Mapped[int] = mapped_column(ForeignKey("reviews.id"), nullable=True)
@@ -44,11 +46,16 @@ class Product(Base):
                                                     back_populates="product",
                                                     foreign_keys="Reviews.product_id")
     rating: Mapped[float | None] = mapped_column(Numeric(2, 1), nullable=True, server_default=text("0"))
+    # Сумма и количество оценок активных отзывов; rating = rating_sum / rating_count
+    rating_sum: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False, default=0, server_default=text("0"))
+    rating_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text("0"))
     # Связь с продавцом
     seller: Mapped['User'] = relationship("User", back_populates="products")
 
     __table_args__ = (
         Index("ix_product_tsv_gin", "tsv", postgresql_using="gin"),
+        Index("ix_product_name_trgm", "name", postgresql_using="gin",
+              postgresql_ops={"name": "gin_trgm_ops"}),
     )
     cart_items: Mapped[list['CartItem']] = relationship('CartItem', back_populates='product',
                                                          cascade='all, delete-orphan')
@@ -56,9 +63,15 @@ class Product(Base):
     order_items: Mapped[list['OrderItem']] = relationship('OrderItem', back_populates='product')
 
 
-
-
-
-
-
-
+# Колонки, из которых собирается ProductResponse (без tsv и служебных полей)
+PRODUCT_RESPONSE_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.price,
+    Product.image_url,
+    Product.image_variants,
+    Product.stock,
+    Product.category_id,
+    Product.is_active,
+)
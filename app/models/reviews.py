@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import String, Integer, ForeignKey, Boolean, Numeric, DateTime
+from sqlalchemy import String, Integer, ForeignKey, Boolean, Numeric, DateTime, Index, text
 from decimal import Decimal
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from app.models.products import Product
@@ -19,6 +19,15 @@ class Reviews(Base):
     grade: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
 
+    __table_args__ = (
+        # Листинги активных отзывов с пагинацией по ключу: новые сначала и по оценке
+        Index("ix_reviews_product_id_comment_date", "product_id", text("comment_date DESC"), text("id DESC"),
+              postgresql_where=text("is_active")),
+        Index("ix_reviews_product_id_grade", "product_id", text("grade DESC"), text("id DESC"),
+              postgresql_where=text("is_active")),
+        Index("ix_reviews_comment_date", text("comment_date DESC"), text("id DESC"),
+              postgresql_where=text("is_active")),
+    )
 
     # Связи
     user: Mapped["User"] = relationship("User", back_populates="reviews")
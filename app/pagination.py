@@ -0,0 +1,43 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(values: dict[str, Any]) -> str:
+    """
+    Кодирует значения ключа последней записи страницы в непрозрачный курсор.
+    """
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _cursor_value(value: Any, expected: type) -> Any:
+    if expected is datetime:
+        # В курсоре даты хранятся строкой ISO 8601
+        return datetime.fromisoformat(value)
+    if isinstance(value, bool):
+        raise TypeError("bool is not allowed in cursor")
+    if expected is float and isinstance(value, int):
+        return float(value)
+    if not isinstance(value, expected):
+        raise TypeError(f"expected {expected.__name__}")
+    return value
+
+
+def decode_cursor(cursor: str, **fields: type) -> dict[str, Any]:
+    """
+    Декодирует курсор и проверяет, что в нём есть все нужные ключи нужных типов
+    (int, float, str или datetime), например decode_cursor(cursor, id=int).
+    Подделанный курсор даёт 400, а не ошибку базы.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, dict):
+            raise TypeError("cursor must be an object")
+        return {key: _cursor_value(values[key], expected) for key, expected in fields.items()}
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
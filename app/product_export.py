@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+from collections.abc import AsyncIterator
+from typing import Literal
+
+from sqlalchemy import select
+
+from app.config import settings
+from app.database import async_sessionmaker
+from app.models.products import Product as ProductModel, PRODUCT_RESPONSE_COLUMNS
+
+
+ExportFormat = Literal["ndjson", "csv"]
+
+EXPORT_MEDIA_TYPES: dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+EXPORT_FIELDS = [column.key for column in PRODUCT_RESPONSE_COLUMNS]
+
+
+def _encode_chunk(rows, file_format: ExportFormat, with_header: bool) -> str:
+    if file_format == "ndjson":
+        return "".join(json.dumps(dict(row), ensure_ascii=False, default=str) + "\n" for row in rows)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if with_header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows(
+        [json.dumps(row[field]) if isinstance(row[field], dict) else row[field] for field in EXPORT_FIELDS]
+        for row in rows
+    )
+    return buffer.getvalue()
+
+
+async def stream_products(filters: list, file_format: ExportFormat) -> AsyncIterator[str]:
+    """
+    Выгружает товары по фильтрам в NDJSON или CSV по мере чтения из базы.
+    Строки читаются с серверного курсора пачками по EXPORT_BATCH_SIZE, поэтому
+    память не зависит от размера каталога. Используется своя сессия: генератор
+    работает, пока отправляется ответ, то есть дольше сессии запроса.
+    """
+    stmt = (
+        select(*PRODUCT_RESPONSE_COLUMNS)
+        .where(*filters)
+        .order_by(ProductModel.id)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+    async with async_sessionmaker() as db:
+        result = await db.stream(stmt)
+        with_header = True
+        async for rows in result.mappings().partitions():
+            yield _encode_chunk(rows, file_format, with_header)
+            with_header = False
+        if with_header and file_format == "csv":
+            # Пустая выгрузка в CSV — только заголовок
+            yield _encode_chunk([], file_format, with_header)
@@ -0,0 +1,161 @@
+import csv
+import io
+import itertools
+import json
+from typing import Any, Iterator, Literal
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.models.categories import Category as CategoryModel
+from app.models.products import Product as ProductModel
+from app.schemas import ProductCreate, ProductImportError, ProductImportReport
+
+
+ImportFormat = Literal["csv", "ndjson"]
+
+
+def detect_format(filename: str | None, content_type: str | None) -> ImportFormat | None:
+    """
+    Определяет формат файла по расширению или Content-Type.
+    """
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    if name.endswith(".csv") or content_type in ("text/csv", "application/csv"):
+        return "csv"
+    return None
+
+
+class ReadError(str):
+    """
+    Ошибка кодировки или разбора файла: строки после неё не читаются.
+    """
+
+
+def iter_rows(binary_file: io.IOBase, file_format: ImportFormat) -> Iterator[tuple[int, dict[str, Any] | str]]:
+    """
+    Построчно читает CSV или NDJSON и выдаёт (номер строки, данные или текст ошибки разбора).
+    В памяти одновременно находится только текущая строка. Если файл не в UTF-8 или CSV
+    повреждён, последним выдаётся ReadError с номером строки, где остановилось чтение.
+    """
+    text_file = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    line_num = 0
+    try:
+        if file_format == "csv":
+            reader = csv.DictReader(text_file)
+            for row in reader:
+                line_num = reader.line_num
+                # Пустые ячейки CSV означают отсутствие значения
+                yield line_num, {key: value or None for key, value in row.items() if key is not None}
+            return
+
+        for line_num, line in enumerate(text_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, f"Invalid JSON: {e}"
+                continue
+            yield line_num, row if isinstance(row, dict) else "Row must be a JSON object"
+    except UnicodeDecodeError:
+        yield line_num + 1, ReadError("File must be UTF-8 encoded (invalid bytes at or after this row); import stopped")
+    except csv.Error as e:
+        yield line_num + 1, ReadError(f"Invalid CSV: {e}; import stopped")
+    finally:
+        # Файл загрузки закрывает сам UploadFile
+        text_file.detach()
+
+
+def _format_db_error(error: DBAPIError) -> str:
+    # Первая строка сообщения драйвера, без SQL и параметров
+    message = str(error.orig).strip().splitlines()
+    return f"Database error: {message[0] if message else type(error.orig).__name__}"
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}" for item in error.errors()
+    )
+
+
+async def import_products(db: AsyncSession, binary_file: io.IOBase, file_format: ImportFormat,
+                          seller_id: int) -> ProductImportReport:
+    """
+    Импортирует товары продавца пачками по IMPORT_BATCH_SIZE строк.
+    Для каждой пачки: валидация через ProductCreate, один запрос на проверку категорий,
+    один многострочный INSERT ... RETURNING и commit. Чтение файла идёт в пуле потоков.
+    Если база отклонила пачку, её строки вставляются по одной, чтобы в отчёт попали
+    только ошибочные строки. Ошибка кодировки или разбора CSV останавливает импорт:
+    уже созданные товары остаются, отчёт возвращается с completed=False.
+    """
+    report = ProductImportReport(created=0, failed=0, errors=[])
+    rows = iter_rows(binary_file, file_format)
+
+    def add_error(row: int, message: str) -> None:
+        report.failed += 1
+        if len(report.errors) < settings.IMPORT_MAX_REPORTED_ERRORS:
+            report.errors.append(ProductImportError(row=row, error=message))
+        else:
+            report.errors_truncated = True
+
+    while True:
+        batch = await run_in_threadpool(list, itertools.islice(rows, settings.IMPORT_BATCH_SIZE))
+        if not batch:
+            break
+
+        valid: list[tuple[int, ProductCreate]] = []
+        for line_num, row in batch:
+            if isinstance(row, ReadError):
+                report.completed = False
+            if isinstance(row, str):
+                add_error(line_num, row)
+                continue
+            try:
+                valid.append((line_num, ProductCreate.model_validate(row)))
+            except ValidationError as e:
+                add_error(line_num, _format_validation_error(e))
+
+        category_ids = {product.category_id for _, product in valid}
+        active_categories = set()
+        if category_ids:
+            active_categories = set((await db.scalars(
+                select(CategoryModel.id).where(CategoryModel.id.in_(category_ids),
+                                               CategoryModel.is_active == True)
+            )).all())
+
+        line_nums, values = [], []
+        for line_num, product in valid:
+            if product.category_id not in active_categories:
+                add_error(line_num, "Category not found or inactive")
+                continue
+            line_nums.append(line_num)
+            values.append({**product.model_dump(), "seller_id": seller_id, "is_active": True})
+
+        if not values:
+            continue
+        insert_stmt = insert(ProductModel).returning(ProductModel.id)
+        try:
+            created_ids = (await db.scalars(insert_stmt, values)).all()
+            await db.commit()
+            report.created += len(created_ids)
+            continue
+        except DBAPIError:
+            await db.rollback()
+
+        for line_num, row_values in zip(line_nums, values):
+            try:
+                await db.execute(insert_stmt, row_values)
+                await db.commit()
+                report.created += 1
+            except DBAPIError as e:
+                await db.rollback()
+                add_error(line_num, _format_db_error(e))
+
+    report.errors.sort(key=lambda item: item.row)
+    return report
@@ -0,0 +1,91 @@
+"""
+Агрегаты рейтинга товара.
+
+В products хранятся rating_sum и rating_count по активным отзывам, а rating
+выводится из них. Отзыв добавляет или вычитает свою оценку одним UPDATE в той же
+транзакции, что и вставка/мягкое удаление отзыва, без пересчёта AVG по всем отзывам.
+
+Полный пересчёт (после ручных правок данных или сбоев):
+    python -m app.ratings
+"""
+import asyncio
+from decimal import Decimal
+
+from sqlalchemy import case, exists, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.products import Product as ProductModel
+from app.models.reviews import Reviews as ReviewsModel
+
+
+def _rating_from(rating_sum, rating_count):
+    return case((rating_count > 0, func.round(rating_sum / rating_count, 1)), else_=0)
+
+
+async def _change_product_rating(db: AsyncSession, product_id: int, grade_delta, count_delta: int) -> None:
+    # В SET все выражения видят значения строки до обновления
+    new_sum = ProductModel.rating_sum + grade_delta
+    new_count = ProductModel.rating_count + count_delta
+    await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == product_id)
+        .values(rating_sum=new_sum, rating_count=new_count, rating=_rating_from(new_sum, new_count))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def add_review_grade(db: AsyncSession, product_id: int, grade: int | Decimal) -> None:
+    """
+    Учитывает оценку нового отзыва в рейтинге товара (без commit).
+    """
+    await _change_product_rating(db, product_id, grade, 1)
+
+
+async def remove_review_grade(db: AsyncSession, product_id: int, grade: int | Decimal) -> None:
+    """
+    Убирает оценку удалённого отзыва из рейтинга товара (без commit).
+    """
+    await _change_product_rating(db, product_id, -grade, -1)
+
+
+async def repair_product_ratings(db: AsyncSession) -> int:
+    """
+    Пересчитывает rating_sum, rating_count и rating всех товаров по активным отзывам
+    двумя пакетными UPDATE и фиксирует транзакцию. Возвращает число обновлённых строк.
+    """
+    agg = (
+        select(ReviewsModel.product_id,
+               func.sum(ReviewsModel.grade).label("grade_sum"),
+               func.count().label("grade_count"))
+        .where(ReviewsModel.is_active == True)
+        .group_by(ReviewsModel.product_id)
+        .subquery()
+    )
+    with_reviews = await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == agg.c.product_id)
+        .values(rating_sum=agg.c.grade_sum, rating_count=agg.c.grade_count,
+                rating=_rating_from(agg.c.grade_sum, agg.c.grade_count))
+        .execution_options(synchronize_session=False)
+    )
+    without_reviews = await db.execute(
+        update(ProductModel)
+        .where(~exists().where(ReviewsModel.product_id == ProductModel.id, ReviewsModel.is_active == True))
+        .values(rating_sum=0, rating_count=0, rating=0)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return with_reviews.rowcount + without_reviews.rowcount
+
+
+async def main() -> None:
+    from app.database import async_engine, async_sessionmaker
+
+    async with async_sessionmaker() as db:
+        updated = await repair_product_ratings(db)
+    await async_engine.dispose()
+    print(f"Пересчитан рейтинг товаров: {updated}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
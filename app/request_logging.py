@@ -0,0 +1,110 @@
+import atexit
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+
+from loguru import logger
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import Settings, settings
+
+
+class QueueSink:
+    """
+    Sink для loguru: отформатированная запись кладётся в очередь,
+    а в поток (stderr) её пишет отдельный фоновый поток.
+    Цикл событий не ждёт записи в медленный stderr/pipe.
+    """
+
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+        self._queue: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._worker, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        self._queue.put(message)
+
+    def _worker(self) -> None:
+        while (message := self._queue.get()) is not None:
+            self.stream.write(message)
+            # Пишем пачкой всё, что накопилось, и только потом сбрасываем буфер
+            while not self._queue.empty():
+                message = self._queue.get()
+                if message is None:
+                    self.stream.flush()
+                    return
+                self.stream.write(message)
+            self.stream.flush()
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+
+def configure_logging(config: Settings = settings) -> None:
+    """
+    Настраивает loguru: JSON-записи в stderr. При LOG_ENQUEUE запись идёт
+    через очередь и фоновый поток.
+    """
+    logger.remove()
+    if config.LOG_ENQUEUE:
+        sink = QueueSink(sys.stderr)
+        atexit.register(sink.stop)
+        logger.add(sink.write, format="{message}", serialize=True, level=config.LOG_LEVEL)
+    else:
+        logger.add(sys.stderr, format="{message}", serialize=True, level=config.LOG_LEVEL)
+
+
+def _should_log(status_code: int, sample_rate: float) -> bool:
+    # Ошибки логируем всегда, успешные запросы — с заданной долей
+    if status_code >= 400 or sample_rate >= 1:
+        return True
+    return random.random() < sample_rate
+
+
+class RequestLoggingMiddleware:
+    """
+    ASGI-middleware: присваивает запросу correlation ID, прокидывает его во все
+    записи лога внутри запроса и в заголовок ответа, пишет итоговую запись о запросе.
+    Реализовано на чистом ASGI, без BaseHTTPMiddleware и лишних задач на запрос.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header_name = settings.REQUEST_ID_HEADER
+        request_id = Headers(scope=scope).get(header_name) or uuid.uuid4().hex
+        scope.setdefault("state", {})["request_id"] = request_id
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)[header_name] = request_id
+            await send(message)
+
+        start_time = time.perf_counter()
+        with logger.contextualize(request_id=request_id):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                process_time = (time.perf_counter() - start_time) * 1000
+                if _should_log(status_code, settings.LOG_SUCCESS_SAMPLE_RATE):
+                    logger.info({
+                        "event": "request",
+                        "request_path": scope["path"],
+                        "method": scope["method"],
+                        "status_code": status_code,
+                        "process_time_ms": f"{process_time:.2f}"
+                    })
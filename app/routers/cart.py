@@ -1,15 +1,21 @@
 from decimal import Decimal
 from fastapi import APIRouter, HTTPException, Depends, Response, status
-from sqlalchemy import delete, select
+from sqlalchemy import delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
 from app.auth import get_current_user
 from app.db_depends import get_async_db
+from app.catalog_cache import get_active_product
+from app.cart_store import cart_store
+from app.serialization import json_response
 from app.models import CartItem as CartItemModel
 from app.models import Product as ProductModel
+from app.models.products import PRODUCT_RESPONSE_COLUMNS
 from app.models import User as UserModel
 from app.schemas import (
+    CartBatchOperation,
+    CartBatchRequest,
     CartResponse,
     CartItem as CartSchema,
     CartItemCreate,
@@ -21,80 +27,115 @@ router = APIRouter(prefix="/cart", tags=["cart"])
 
 
 async def _ensure_product_available(db: AsyncSession, product_id: int) -> None:
-    result = await db.scalars(
-        select(ProductModel).where(
-            ProductModel.id == product_id,
-            ProductModel.is_active == True,)
-    )
-    product = result.first()
+    product = await get_active_product(db, product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Product not found or inactive",
                             )
 
-async def _get_cart_item(
-        db: AsyncSession,
-        user_id: int,
-        product_id: int,
-        ) -> CartItemModel | None:
-    result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
-        .where(CartItemModel.user_id == user_id,
-               CartItemModel.product_id == product_id,
-               )
-    )
-    return result.first()
+def _cart_item_from_row(row) -> dict:
+    data = dict(row)
+    return {"id": data.pop("cart_item_id"), "quantity": data.pop("cart_item_quantity"), "product": data}
+
+
+async def _load_cart(db: AsyncSession, user_id: int) -> dict:
+    """
+    Загружает корзину одним запросом: строки корзины с колонками товара и итоги,
+    посчитанные в SQL оконными SUM(quantity) и SUM(quantity * price), без ORM-объектов.
+    Возвращает данные для CartResponse.
+    """
+    rows = (await db.execute(
+        select(CartItemModel.id.label("cart_item_id"), CartItemModel.quantity.label("cart_item_quantity"),
+               *PRODUCT_RESPONSE_COLUMNS,
+               func.sum(CartItemModel.quantity).over().label("total_quantity"),
+               func.sum(CartItemModel.quantity * ProductModel.price).over().label("total_price"))
+        .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+        .where(CartItemModel.user_id == user_id)
+        .order_by(CartItemModel.id)
+    )).mappings().all()
+
+    items = []
+    for row in rows:
+        row = dict(row)
+        total_quantity, total_price = row.pop("total_quantity"), row.pop("total_price")
+        items.append(_cart_item_from_row(row))
+
+    return {
+        "user_id": user_id,
+        "items": items,
+        "total_quantity": total_quantity if rows else 0,
+        "total_price": total_price if rows else Decimal("0"),
+    }
+
+
+def _collapse_operations(operations: list[CartBatchOperation]) -> dict[int, tuple[str, int]]:
+    """
+    Сводит последовательность операций к одному итоговому действию на товар:
+    ("add", n) — прибавить n, ("set", n) — установить n, ("remove", 0) — удалить.
+    """
+    final: dict[int, tuple[str, int]] = {}
+    for operation in operations:
+        previous = final.get(operation.product_id)
+        if operation.op == "remove":
+            final[operation.product_id] = ("remove", 0)
+        elif operation.op == "set" or previous is None:
+            final[operation.product_id] = (operation.op, operation.quantity)
+        elif previous[0] == "remove":
+            # После удаления товара добавление задаёт количество с нуля
+            final[operation.product_id] = ("set", operation.quantity)
+        else:
+            final[operation.product_id] = (previous[0], previous[1] + operation.quantity)
+    return final
 
 
 @router.get("/", response_model=CartResponse)
 async def get_cart(
         db: AsyncSession = Depends(get_async_db),
         current_user: UserModel = Depends(get_current_user)):
-    result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
-        .where(CartItemModel.user_id == current_user.id)
-        .order_by(CartItemModel.id)
-    )
-    items = result.all()
-
-    total_quantity = sum(item.quantity for item in items)
-    price_items = (
-        Decimal(item.quantity) *
-        (item.product.price if item.product.price is not None else Decimal("0"))
-        for item in items
-    )
-    total_price_decimal = sum(price_items, Decimal("0"))
-
-    return CartResponse(
-        user_id=current_user.id,
-        items=items,
-        total_quantity=total_quantity,
-        total_price=total_price_decimal,
-    )
+    if cart_store is not None:
+        return json_response(await cart_store.render(db, current_user.id), CartResponse)
+    return json_response(await _load_cart(db, current_user.id), CartResponse)
 
 @router.post("/items", response_model=CartSchema, status_code=status.HTTP_201_CREATED)
 async def add_item_to_cart(
         payload: CartItemCreate,
         db: AsyncSession = Depends(get_async_db),
         current_user: UserModel = Depends(get_current_user)):
-    await _ensure_product_available(db, payload.product_id)
+    """
+    Добавляет товар в корзину или увеличивает его количество одним запросом:
+    INSERT ... SELECT из активного товара ... ON CONFLICT DO UPDATE ... RETURNING,
+    соединённый с товаром в том же выражении. Параллельные добавления одного
+    товара не конфликтуют по uq_cart_items_user_product.
+    """
+    if cart_store is not None:
+        await _ensure_product_available(db, payload.product_id)
+        quantity = await cart_store.add(db, current_user.id, payload.product_id, payload.quantity)
+        item = {"id": payload.product_id, "quantity": quantity,
+                "product": await get_active_product(db, payload.product_id)}
+        return json_response(item, CartSchema, status_code=status.HTTP_201_CREATED)
 
-    cart_item = await _get_cart_item(db,  current_user.id, payload.product_id)
-    if cart_item:
-        cart_item.quantity += payload.quantity
-    else:
-        cart_item = CartItemModel(
-            user_id=current_user.id,
-            product_id=payload.product_id,
-            quantity=payload.quantity,
-        )
-        db.add(cart_item)
+    insert_stmt = pg_insert(CartItemModel).from_select(
+        ["user_id", "product_id", "quantity"],
+        select(literal(current_user.id), ProductModel.id, literal(payload.quantity))
+        .where(ProductModel.id == payload.product_id, ProductModel.is_active == True),
+    )
+    upserted = insert_stmt.on_conflict_do_update(
+        constraint="uq_cart_items_user_product",
+        set_={"quantity": CartItemModel.quantity + insert_stmt.excluded.quantity, "updated_at": func.now()},
+    ).returning(CartItemModel.id, CartItemModel.product_id, CartItemModel.quantity).cte("upserted")
 
+    row = (await db.execute(
+        select(upserted.c.id.label("cart_item_id"), upserted.c.quantity.label("cart_item_quantity"),
+               *PRODUCT_RESPONSE_COLUMNS)
+        .join(ProductModel, ProductModel.id == upserted.c.product_id)
+    )).mappings().first()
+    # Ничего не вставлено — товара нет или он неактивен
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Product not found or inactive",
+                            )
     await db.commit()
-    updated_item = await _get_cart_item(db, current_user.id, payload.product_id)
-    return updated_item
+    return json_response(_cart_item_from_row(row), CartSchema, status_code=status.HTTP_201_CREATED)
 
 
 @router.put("/items/{product_id}", response_model=CartSchema)
@@ -103,19 +144,37 @@ async def update_cart_item(
         payload: CartItemUpdate,
         db: AsyncSession = Depends(get_async_db),
         current_user: UserModel = Depends(get_current_user)):
-    await _ensure_product_available(db, product_id)
+    """
+    Устанавливает количество товара в корзине одним UPDATE ... FROM products ... RETURNING.
+    """
+    if cart_store is not None:
+        await _ensure_product_available(db, product_id)
+        if not await cart_store.set(db, current_user.id, product_id, payload.quantity):
+            raise HTTPException(status_code=404, detail="Item not found in cart")
+        item = {"id": product_id, "quantity": payload.quantity,
+                "product": await get_active_product(db, product_id)}
+        return json_response(item, CartSchema)
 
-    cart_item = await _get_cart_item(db, current_user.id, product_id,)
-    if not cart_item:
+    row = (await db.execute(
+        update(CartItemModel)
+        .where(CartItemModel.user_id == current_user.id,
+               CartItemModel.product_id == product_id,
+               ProductModel.id == CartItemModel.product_id,
+               ProductModel.is_active == True)
+        .values(quantity=payload.quantity, updated_at=func.now())
+        .returning(CartItemModel.id.label("cart_item_id"), CartItemModel.quantity.label("cart_item_quantity"),
+                   *PRODUCT_RESPONSE_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )).mappings().first()
+    if row is None:
+        # Разбираемся в причине только на редком пути ошибки
+        await _ensure_product_available(db, product_id)
         raise HTTPException(
                 status_code=404,
                 detail="Item not found in cart",
         )
-
-    cart_item.quantity = payload.quantity
     await db.commit()
-    updated_item = await _get_cart_item(db, current_user.id, product_id)
-    return updated_item
+    return json_response(_cart_item_from_row(row), CartSchema)
 
 
 @router.delete("/items/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -123,22 +182,83 @@ async def remove_item_from_cart(
         product_id: int,
         db: AsyncSession = Depends(get_async_db),
         current_user: UserModel = Depends(get_current_user)):
-    cart_item = await _get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
+    if cart_store is not None:
+        removed = await cart_store.remove(db, current_user.id, product_id)
+    else:
+        removed = (await db.execute(
+            delete(CartItemModel)
+            .where(CartItemModel.user_id == current_user.id, CartItemModel.product_id == product_id)
+            .returning(CartItemModel.id)
+        )).first() is not None
+        await db.commit()
+    if not removed:
         raise HTTPException(
                 status_code=404,
                 detail="Item not found in cart",
         )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-    await db.delete(cart_item)
+
+@router.post("/items/batch", response_model=CartResponse)
+async def apply_cart_batch(
+        payload: CartBatchRequest,
+        db: AsyncSession = Depends(get_async_db),
+        current_user: UserModel = Depends(get_current_user)):
+    """
+    Применяет список операций add/set/remove к корзине в одной транзакции и возвращает корзину.
+    Доступность всех товаров проверяется одним запросом IN; при недоступном товаре
+    не применяется ни одна операция. Запись — INSERT ... ON CONFLICT DO UPDATE
+    по uq_cart_items_user_product и один DELETE для удаляемых товаров.
+    """
+    final = _collapse_operations(payload.operations)
+    upserts = {product_id: action for product_id, action in final.items() if action[0] != "remove"}
+    removed_ids = [product_id for product_id, action in final.items() if action[0] == "remove"]
+
+    if upserts:
+        available_ids = set((await db.scalars(
+            select(ProductModel.id).where(ProductModel.id.in_(upserts), ProductModel.is_active == True)
+        )).all())
+        missing_ids = sorted(set(upserts) - available_ids)
+        if missing_ids:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=f"Products not found or inactive: {', '.join(map(str, missing_ids))}",
+                                )
+
+    if cart_store is not None:
+        await cart_store.apply(db, current_user.id, final)
+        return json_response(await cart_store.render(db, current_user.id), CartResponse)
+
+    for kind in ("add", "set"):
+        rows = [
+            {"user_id": current_user.id, "product_id": product_id, "quantity": quantity}
+            for product_id, (action, quantity) in upserts.items() if action == kind
+        ]
+        if not rows:
+            continue
+        stmt = pg_insert(CartItemModel).values(rows)
+        new_quantity = (CartItemModel.quantity + stmt.excluded.quantity if kind == "add"
+                        else stmt.excluded.quantity)
+        await db.execute(stmt.on_conflict_do_update(
+            constraint="uq_cart_items_user_product",
+            set_={"quantity": new_quantity, "updated_at": func.now()},
+        ))
+
+    if removed_ids:
+        await db.execute(
+            delete(CartItemModel).where(CartItemModel.user_id == current_user.id,
+                                        CartItemModel.product_id.in_(removed_ids))
+        )
     await db.commit()
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return json_response(await _load_cart(db, current_user.id), CartResponse)
 
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 async def clear_cart(
         db: AsyncSession = Depends(get_async_db),
         current_user: UserModel = Depends(get_current_user)):
+    if cart_store is not None:
+        await cart_store.clear(current_user.id)
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
     await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
     await db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
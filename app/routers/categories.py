@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import select, update
 
-from app.models.categories import Category as CategoryModel
-from app.schemas import CategoryResponse, CategoryCreate
+from app.models.categories import Category as CategoryModel, CATEGORY_RESPONSE_COLUMNS
+from app.schemas import CategoryResponse, CategoryCreate, CategoryTreeNode
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db_depends import get_async_db
+from app.catalog_cache import invalidate_category
+from app.category_tree import get_category_tree, get_descendant_ids, invalidate_category_tree
+from app.serialization import json_response
 
 
 # Создаём маршрутизатор с префиксом и тегом
@@ -19,12 +22,21 @@ router = APIRouter(
 async def get_all_categories(db: AsyncSession = Depends(get_async_db)):
     """
     Возвращает список всех активных категорий.
+    Выбираются только колонки ответа, строки отдаются без ORM-объектов.
     """
-    stmt = select(CategoryModel).where(CategoryModel.is_active == True)
-    result = await db.scalars(stmt)
-    categories = result.all()
+    stmt = select(*CATEGORY_RESPONSE_COLUMNS).where(CategoryModel.is_active == True)
+    result = await db.execute(stmt)
+    categories = [dict(row) for row in result.mappings()]
+
+    return json_response(categories, list[CategoryResponse])
+
 
-    return categories
+@router.get("/tree", response_model=list[CategoryTreeNode])
+async def get_categories_tree(db: AsyncSession = Depends(get_async_db)):
+    """
+    Возвращает дерево активных категорий целиком за один запрос.
+    """
+    return await get_category_tree(db)
 
 
 @router.post("/", response_model=CategoryResponse, status_code=status.HTTP_201_CREATED)
@@ -46,6 +58,7 @@ async def create_category(category: CategoryCreate, db: AsyncSession = Depends(g
     db_category = CategoryModel(**category.model_dump())
     db.add(db_category)
     await db.commit()
+    await invalidate_category_tree()
     return db_category
 
 @router.put("/{category_id}", response_model=CategoryResponse)
@@ -61,12 +74,15 @@ async def update_category(category_id: int, category: CategoryCreate, db: AsyncS
         raise HTTPException(status_code=404, detail="Category not found")
 
     if category.parent_id is not None:
-        parent_stmt = select(CategoryModel).where(CategoryModel.id == db_category.parent_id,
+        parent_stmt = select(CategoryModel).where(CategoryModel.id == category.parent_id,
                                                   CategoryModel.is_active == True)
         result = await db.scalars(parent_stmt)
         parent = result.first()
         if parent is None:
             raise HTTPException(status_code=400, detail="Parent category not found")
+        # Родителем не может быть сама категория или её потомок — иначе в дереве появится цикл
+        if category.parent_id in (await get_descendant_ids(db, category_id) or [category_id]):
+            raise HTTPException(status_code=400, detail="Category cannot be moved under itself")
 
     # Обновляем категорию
     update_data = category.model_dump(exclude_unset=True)
@@ -76,6 +92,7 @@ async def update_category(category_id: int, category: CategoryCreate, db: AsyncS
         .values(**update_data)
     )
     await db.commit()
+    await invalidate_category_tree()
     return db_category
 
 @router.delete("/{category_id}", status_code=status.HTTP_200_OK)
@@ -90,6 +107,8 @@ async def delete_category(category_id: int, db: AsyncSession = Depends(get_async
         raise HTTPException(status_code=404, detail="Category not found")
     await db.execute(update(CategoryModel).where(CategoryModel.id == category_id).values(is_active=False))
     await db.commit()
+    await invalidate_category(category_id)
+    await invalidate_category_tree()
 
     return {'status': 'success', 'message': 'Category marked as inactive'}
 
@@ -1,14 +1,20 @@
+from datetime import datetime
 from decimal import Decimal
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, delete
+from sqlalchemy import select, func, delete, update, insert, tuple_
 from sqlalchemy.orm import selectinload
 
 from app.auth import get_current_user
 from app.db_depends import get_async_db
 from app.models.cart_items import CartItem as CartItemModel
 from app.models.orders import Order as OrderModel, OrderItem as OrderItemModel
+from app.models.products import Product as ProductModel, PRODUCT_RESPONSE_COLUMNS
+from app.catalog_cache import invalidate_product
+from app.cart_store import cart_store
+from app.pagination import encode_cursor, decode_cursor
+from app.serialization import json_response
 from app.models.users import User as UserModel
 from app.schemas import OrderResponse as OrderSchema, OrderList
 
@@ -34,81 +40,137 @@ async def checkout_order(
     """
     Создаёт заказ на основе текущей корзины пользователя.
     Сохраняет позиции заказа, вычитает остатки и очищает корзину.
+
+    Всё выполняется в одной транзакции: строки корзины и товаров блокируются
+    в порядке id товара, остатки списываются одним UPDATE ... WHERE stock >= quantity
+    RETURNING, позиции заказа вставляются одним пакетным INSERT.
     """
-    cart_result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
+    # Корзина в Redis сначала записывается в cart_items
+    if cart_store is not None and not await cart_store.flush_user(db, current_user.id, wait=True):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Cart is being saved, please retry")
+
+    # Блокируем корзину и товары в едином порядке, чтобы параллельные оформления не взаимоблокировались
+    cart_lines = (await db.execute(
+        select(CartItemModel.product_id, CartItemModel.quantity, ProductModel.name, ProductModel.is_active)
+        .join(ProductModel, ProductModel.id == CartItemModel.product_id)
         .where(CartItemModel.user_id == current_user.id)
-        .order_by(CartItemModel.id)
-    )
-    cart_items = cart_result.all()
-    if not cart_items:
+        .order_by(ProductModel.id)
+        .with_for_update()
+    )).all()
+    if not cart_lines:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty")
+    for line in cart_lines:
+        if not line.is_active:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Product {line.product_id} is unavailable",)
 
-    order = OrderModel(user_id=current_user.id)
-    total_amount = Decimal('0')
+    # Списываем остатки одним запросом; товары без достаточного остатка не попадут в RETURNING
+    updated_products = (await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == CartItemModel.product_id,
+               CartItemModel.user_id == current_user.id,
+               ProductModel.is_active == True,
+               ProductModel.stock >= CartItemModel.quantity)
+        .values(stock=ProductModel.stock - CartItemModel.quantity)
+        .returning(*PRODUCT_RESPONSE_COLUMNS, CartItemModel.quantity.label("ordered_quantity"))
+        .execution_options(synchronize_session=False)
+    )).mappings().all()
+    if len(updated_products) != len(cart_lines):
+        await db.rollback()
+        updated_ids = {product["id"] for product in updated_products}
+        short = next(line for line in cart_lines if line.product_id not in updated_ids)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Not enough stock for product {short.name}",
+                            )
 
-    for cart_item in cart_items:
-        product = cart_item.product
-        if not product or not product.is_active:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                detail=f"Product {cart_item.product_id} is unavailable",)
-        if product.stock < cart_item.quantity:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                detail=f"Not enough stock for product {product.name}",
-                                )
-        unit_price = product.price
-        if unit_price is None:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                detail=f"Product {product.name} has no price set",
-                                )
-        total_price = unit_price * cart_item.quantity
+    lines = []
+    total_amount = Decimal('0')
+    for product in updated_products:
+        product = dict(product)
+        quantity = product.pop("ordered_quantity")
+        total_price = product["price"] * quantity
         total_amount += total_price
+        lines.append({
+            "product_id": product["id"],
+            "quantity": quantity,
+            "unit_price": product["price"],
+            "total_price": total_price,
+            "product": product,
+        })
 
-        order_item = OrderItemModel(
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity,
-            unit_price=unit_price,
-            total_price=total_price,
-        )
-        order.items.append(order_item)
-        product.stock -= cart_item.quantity
+    order = (await db.execute(
+        insert(OrderModel)
+        .values(user_id=current_user.id, status="pending", total_amount=total_amount)
+        .returning(OrderModel.id, OrderModel.user_id, OrderModel.status, OrderModel.total_amount,
+                   OrderModel.created_at, OrderModel.updated_at)
+    )).mappings().one()
 
-    order.total_amount = total_amount
-    db.add(order)
+    # Пакетная вставка позиций заказа (insertmanyvalues), id возвращаются в порядке параметров
+    item_ids = (await db.scalars(
+        insert(OrderItemModel).returning(OrderItemModel.id, sort_by_parameter_order=True),
+        [{"order_id": order["id"], "product_id": line["product_id"], "quantity": line["quantity"],
+          "unit_price": line["unit_price"], "total_price": line["total_price"]} for line in lines],
+    )).all()
 
     await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
     await db.commit()
+    if cart_store is not None:
+        await cart_store.forget(current_user.id)
+    # В карточках товаров изменился остаток
+    await invalidate_product(*(line["product_id"] for line in lines))
 
-    created_order = await _load_order_with_items(db, order.id)
-    if not created_order:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail="Failed to load order after creation",
-                            )
-    return created_order
+    # Ответ собираем из уже полученных данных, без повторной загрузки заказа
+    return json_response({
+        **order,
+        "items": [{"id": item_id, **line} for item_id, line in zip(item_ids, lines)],
+    }, OrderSchema, status_code=status.HTTP_201_CREATED)
 
 @router.get("/", response_model=OrderList)
 async def list_orders(
         page: int = Query(1, ge=1),
         page_size: int = Query(10, ge=1, le=100),
+        cursor: str | None = Query(
+            None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
         db: AsyncSession = Depends(get_async_db),
         current_user: UserModel = Depends(get_current_user)
 ):
     """
-    Возвращает заказы текущего пользователя с простой пагинацией.
+    Возвращает заказы текущего пользователя, новые сначала.
+    С cursor страница выбирается по ключу (created_at, id) по индексу
+    ix_orders_user_id_created_at: два запроса (страница заказов и пакетная загрузка
+    позиций с товарами), время не зависит от длины истории. Без cursor работает
+    прежняя постраничная навигация с подсчётом total.
     """
-    total = await db.scalar(select(func.count(OrderModel.id).where(OrderModel.user_id == current_user.id)))
-    result = await db.scalars(
-        select(OrderModel.id)
-        .options(selectinload(OrderModel.items).selectinload(OrderItemModel.product))
+    stmt = (
+        select(OrderModel)
+        .options(selectinload(OrderModel.items).joinedload(OrderItemModel.product))
         .where(OrderModel.user_id == current_user.id)
-        .order_by(OrderModel.created_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
+        .order_by(OrderModel.created_at.desc(), OrderModel.id.desc())
     )
-    orders = result.all()
 
-    return OrderList(items=orders, total=total or 0, page=page, page_size=page_size)
+    total = None
+    if cursor is not None:
+        last = decode_cursor(cursor, created_at=datetime, id=int)
+        stmt = stmt.where(
+            tuple_(OrderModel.created_at, OrderModel.id) < tuple_(last["created_at"], last["id"])
+        )
+    else:
+        total = await db.scalar(
+            select(func.count()).select_from(OrderModel).where(OrderModel.user_id == current_user.id)
+        ) or 0
+        stmt = stmt.offset((page - 1) * page_size)
+
+    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+    orders = (await db.scalars(stmt.limit(page_size + 1))).all()
+    next_cursor = None
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        next_cursor = encode_cursor({"created_at": orders[-1].created_at.isoformat(), "id": orders[-1].id})
+
+    return json_response({
+        "items": orders, "total": total, "page": page, "page_size": page_size, "next_cursor": next_cursor,
+    }, OrderList)
 
 @router.get("/{order_id}", response_model=OrderSchema)
 async def get_order(
@@ -122,4 +184,4 @@ async def get_order(
     order = await _load_order_with_items(db, order_id)
     if not order or order.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-    return order
\ No newline at end of file
+    return json_response(order, OrderSchema)
\ No newline at end of file
@@ -1,26 +1,45 @@
 from fastapi import APIRouter, status, Depends, HTTPException, Query, File, UploadFile
-from pathlib import Path
+from fastapi.responses import StreamingResponse
+from typing import Literal
+import contextlib
+import json
 import uuid
 
-from app.models import Category as CategoryModel
-from sqlalchemy import select, update, func, desc
+import aiofiles
+import aiofiles.os
 
-from app.models.products import Product as ProductModel
-from app.schemas import ProductResponse, ProductCreate, ProductList
+from sqlalchemy import select, update, func, desc, or_, and_, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.models.products import Product as ProductModel, PRODUCT_RESPONSE_COLUMNS
+from app.schemas import ProductResponse, ProductCreate, ProductList, ProductImportReport
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db_depends import get_async_db
 
 from app.models.users import User as UserModel
 from app.auth import get_current_seller
+from app.pagination import encode_cursor, decode_cursor
+from app.cache import create_cache
+from app.catalog_cache import get_active_product, is_category_active, invalidate_product
+from app.category_tree import get_descendant_ids
+from app.config import PRODUCT_COUNT_CACHE_TTL
+from app.search import SearchMode, build_search_clause
+from app.product_import import ImportFormat, detect_format, import_products
+from app.product_export import EXPORT_MEDIA_TYPES, ExportFormat, stream_products
+from app.serialization import json_response
+from app.images import MEDIA_ROOT, MEDIA_URL, media_path, remove_variant_files, schedule_image_variants
 
 
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-MEDIA_ROOT = BASE_DIR / "media" / "product"
 MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
-ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp"}
 MAX_IMAGE_SIZE = 2 * 1024 * 1024 # 2 097 152 байт
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
 
+# Кэш общего количества товаров по набору фильтров
+product_count_cache = create_cache("products:count", ttl=PRODUCT_COUNT_CACHE_TTL)
 
 
 # Создаём маршрутизатор для товаров
@@ -29,56 +48,108 @@ router = APIRouter(
     tags=['products'],
 )
 
+def sniff_image_extension(head: bytes) -> str | None:
+    """
+    Определяет тип изображения по сигнатуре (magic bytes) и возвращает расширение файла.
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
 async def save_product_image(file: UploadFile) -> str:
     """
     Сохраняет изображение товара и возвращает относительный URL.
+    Файл пишется на диск частями через aiofiles; загрузка прерывается, как только
+    превышен MAX_IMAGE_SIZE. Тип определяется по содержимому, а не по Content-Type клиента.
     """
-    if file.content_type not in ALLOWED_IMAGE_TYPES:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only JPG, PNG or WebP images are allowed")
+    if file.size is not None and file.size > MAX_IMAGE_SIZE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Image is too large")
 
-    content = await file.read()
-    if len(content) > MAX_IMAGE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Image is too large"
-        )
+    head = await file.read(UPLOAD_CHUNK_SIZE)
+    extension = sniff_image_extension(head)
+    if extension is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only JPG, PNG or WebP images are allowed")
 
-    extension = Path(file.filename or "").suffix.lower() or ".jpg" # если нет расширения, то .jpg по умолчанию
     file_name = f"{uuid.uuid4()}{extension}"
     file_path = MEDIA_ROOT / file_name
-    file_path.write_bytes(content)
+    # Пишем во временный файл и переименовываем только после успешной загрузки
+    part_path = file_path.with_name(file_name + ".part")
+    size = 0
+    try:
+        async with aiofiles.open(part_path, "wb") as out:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > MAX_IMAGE_SIZE:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Image is too large")
+                await out.write(chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        await aiofiles.os.replace(part_path, file_path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            await aiofiles.os.remove(part_path)
+        raise
+
+    return f"{MEDIA_URL}/{file_name}"
+
+
+class _ExplainJSON(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) для произвольного SELECT с сохранением связанных параметров.
+    """
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_ExplainJSON, "postgresql")
+def _compile_explain_json(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+async def _estimate_products_count(db: AsyncSession, filters: list, unfiltered: bool) -> int:
+    """
+    Оценивает количество товаров без полного подсчёта.
+    Для списка без фильтров берёт reltuples из pg_class, иначе — оценку строк из плана запроса.
+    Если таблица ещё ни разу не анализировалась (reltuples = -1), считает точно.
+    """
+    if unfiltered:
+        estimate = await db.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'products'::regclass")
+        )
+        if estimate is not None and estimate >= 0:
+            return int(estimate)
+        return await db.scalar(select(func.count()).select_from(ProductModel).where(*filters)) or 0
 
-    return f"/media/products/{file_name}"
+    plan = await db.scalar(_ExplainJSON(select(ProductModel.id).where(*filters)))
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
 
 
-def remove_product_image(url: str | None) -> None:
+async def remove_product_image(url: str | None, variants: dict | None = None) -> None:
     """
-    Удаляет файл изображения, если он существует.
+    Удаляет файл изображения и его производные, если они существуют.
     """
+    await remove_variant_files(variants)
     if not url:
         return
-    relative_path = url.lstrip("/")
-    file_path = BASE_DIR / relative_path
-    if file_path.exists():
-        file_path.unlink()
+    with contextlib.suppress(FileNotFoundError):
+        await aiofiles.os.remove(media_path(url))
 
 
-@router.get('/', response_model=ProductList, status_code=status.HTTP_200_OK)
-async def get_all_products(page: int = Query(1, ge=1),
-                           page_size: int = Query(20, ge=1, le=100),
-                           category_id: int | None = Query(None, description="ID категории для фильтрации"),
-                           search: str | None = Query(None, min_length=1,
-                                                      description="Поиск по названию/описанию товара"),
-                           min_price: float | None = Query(
-                            None, ge=0, description="Минимальная цена для товара"),
-                           max_price: float | None = Query(
-                               None, ge=0, description="Максимальная цена для товара"),
-                           in_stock: bool | None = Query(
-                               None, description="true — только товары в наличии, false — только без остатка"),
-                           seller_id: int | None = Query(None, description="ID продавца для фильтрации"),
-                           db: AsyncSession = Depends(get_async_db)):
+async def _build_product_filters(db: AsyncSession, category_id: int | None, include_subcategories: bool,
+                                 min_price: float | None, max_price: float | None,
+                                 in_stock: bool | None, seller_id: int | None) -> list:
     """
-    Возвращает список всех активных товаров с поддержкой фильтров.
+    Собирает условия выборки активных товаров по параметрам листинга (без поиска).
+    Общие для GET /products/ и GET /products/export.
     """
     # Проверка логики min_price <= max_price
     if min_price is not None and max_price is not None and min_price > max_price:
@@ -89,12 +160,12 @@ async def get_all_products(page: int = Query(1, ge=1),
 
     # Формируем список фильтров
     filters = [ProductModel.is_active == True]
-    if category_id is not None:
+    if category_id is not None and include_subcategories:
+        # Потомки берутся из закэшированной иерархии категорий (см. app/category_tree.py)
+        category_ids = await get_descendant_ids(db, category_id) or [category_id]
+        filters.append(ProductModel.category_id.in_(category_ids))
+    elif category_id is not None:
         filters.append(ProductModel.category_id == category_id)
-    if search is not None:
-        search_value = search.strip()
-        if search_value:
-            filters.append(func.lower(ProductModel.name).like(f'%{search_value.lower()}%'))
     if min_price is not None:
         filters.append(ProductModel.price >= min_price)
     if max_price is not None:
@@ -103,53 +174,146 @@ async def get_all_products(page: int = Query(1, ge=1),
         filters.append(ProductModel.stock > 0 if in_stock else ProductModel.stock == 0)
     if seller_id is not None:
         filters.append(ProductModel.seller_id == seller_id)
+    return filters
 
-    # Базовый запрос total
-    total_stmt = select(func.count()).select_from(ProductModel).where(*filters)
 
+@router.get('/', response_model=ProductList, status_code=status.HTTP_200_OK)
+async def get_all_products(page: int = Query(1, ge=1),
+                           page_size: int = Query(20, ge=1, le=100),
+                           category_id: int | None = Query(None, description="ID категории для фильтрации"),
+                           include_subcategories: bool = Query(
+                               False, description="Вместе с category_id учитывать все её подкатегории"),
+                           search: str | None = Query(None, min_length=1,
+                                                      description="Поиск по названию/описанию товара"),
+                           min_price: float | None = Query(
+                            None, ge=0, description="Минимальная цена для товара"),
+                           max_price: float | None = Query(
+                               None, ge=0, description="Максимальная цена для товара"),
+                           in_stock: bool | None = Query(
+                               None, description="true — только товары в наличии, false — только без остатка"),
+                           seller_id: int | None = Query(None, description="ID продавца для фильтрации"),
+                           cursor: str | None = Query(
+                               None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+                           search_mode: SearchMode = Query(
+                               "auto", description="Режим поиска: auto (полнотекстовый с запасным триграммным), fts или trigram"),
+                           count: Literal["exact", "estimated", "none"] = Query(
+                               "exact", description="Режим подсчёта total: точный, оценка планировщика или без подсчёта"),
+                           db: AsyncSession = Depends(get_async_db)):
+    """
+    Возвращает список всех активных товаров с поддержкой фильтров.
+    Если передан cursor, страница выбирается по ключу (id) или (rank, id) вместо offset,
+    поэтому стоимость запроса не зависит от глубины страницы; total при этом не считается.
+    Точный total кэшируется на короткое время по набору фильтров.
+    """
+    filters = await _build_product_filters(db, category_id, include_subcategories,
+                                           min_price, max_price, in_stock, seller_id)
+
+    # Поиск: индексированный tsvector, при необходимости — триграммы (см. app/search.py)
     rank_col = None
-    if search:
-        search_value = search.strip()
-        if search_value:
-            ts_query = func.websearch_to_tsquery('english', search_value)
-            filters.append(ProductModel.tsv.op('@@')(ts_query))
-            rank_col = func.ts_rank_cd(ProductModel.tsv, ts_query).label('rank')
-            # total с учётом полнотекстового фильтра
+    search_value = search.strip() if search else None
+    if search_value:
+        search_clause = await build_search_clause(db, search_value, search_mode, filters)
+        filters.append(search_clause.filter)
+        rank_col = search_clause.rank
+
+    # Подсчёт total в выбранном режиме; страницы по курсору отдаются без total
+    # (как в GET /orders/), чтобы их стоимость не зависела от размера выборки
+    total = None
+    if cursor is not None:
+        pass
+    elif count == "exact":
+        cache_key = "products:count:" + json.dumps(
+            [category_id, include_subcategories, search_value, search_mode, min_price, max_price, in_stock, seller_id]
+        )
+        total = await product_count_cache.get(cache_key)
+        if total is None:
             total_stmt = select(func.count()).select_from(ProductModel).where(*filters)
-
-
-    total = await db.scalar(total_stmt) or 0
+            total = await db.scalar(total_stmt) or 0
+            await product_count_cache.set(cache_key, total)
+    elif count == "estimated":
+        total = await _estimate_products_count(db, filters, unfiltered=len(filters) == 1)
 
     # Основной запрос (если есть поиск — добавим ранг в выборку и сортировку)
     if rank_col is not None:
         products_stmt = (
-            select(ProductModel, rank_col)
+            select(*PRODUCT_RESPONSE_COLUMNS, rank_col)
             .where(*filters)
             .order_by(desc(rank_col),ProductModel.id)
-            .offset((page - 1) * page_size)
-            .limit(page_size)
         )
-        result = await db.execute(products_stmt)
-        rows = result.all()
-        items = [row[0] for row in rows] # сами объекты
-        # при желании можно вернуть ранг в ответе
-        # ranks = [row.rank for row in rows]
+        if cursor is not None:
+            last = decode_cursor(cursor, rank=float, id=int)
+            products_stmt = products_stmt.where(
+                or_(rank_col < last["rank"],
+                    and_(rank_col == last["rank"], ProductModel.id > last["id"]))
+            )
     else:
         products_stmt = (
-            select(ProductModel)
+            select(*PRODUCT_RESPONSE_COLUMNS)
             .where(*filters)
             .order_by(ProductModel.id)
-            .offset((page - 1) * page_size)
-            .limit(page_size)
         )
-
-        items = (await db.scalars(products_stmt)).all()
-    return {
+        if cursor is not None:
+            last = decode_cursor(cursor, id=int)
+            products_stmt = products_stmt.where(ProductModel.id > last["id"])
+
+    if cursor is None:
+        products_stmt = products_stmt.offset((page - 1) * page_size)
+    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+    # Выбираются только колонки ProductResponse (без tsv), строки отдаются без ORM-объектов
+    result = await db.execute(products_stmt.limit(page_size + 1))
+    rows = result.mappings().all()
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    items = [dict(row) for row in rows] # rank, если есть, схема ответа пропускает
+
+    next_cursor = None
+    if has_next:
+        last_row = rows[-1]
+        if rank_col is not None:
+            next_cursor = encode_cursor({"rank": last_row["rank"], "id": last_row["id"]})
+        else:
+            next_cursor = encode_cursor({"id": last_row["id"]})
+    return json_response({
         "items": items,
         "total": total,
         "page": page,
         "page_size": page_size,
-    }
+        "next_cursor": next_cursor,
+    }, ProductList)
+
+@router.get('/export', status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def export_products(export_format: ExportFormat = Query(
+                              "ndjson", alias="format", description="Формат выгрузки: ndjson или csv"),
+                          category_id: int | None = Query(None, description="ID категории для фильтрации"),
+                          include_subcategories: bool = Query(
+                              False, description="Вместе с category_id учитывать все её подкатегории"),
+                          search: str | None = Query(None, min_length=1,
+                                                     description="Поиск по названию/описанию товара"),
+                          min_price: float | None = Query(
+                              None, ge=0, description="Минимальная цена для товара"),
+                          max_price: float | None = Query(
+                              None, ge=0, description="Максимальная цена для товара"),
+                          in_stock: bool | None = Query(
+                              None, description="true — только товары в наличии, false — только без остатка"),
+                          seller_id: int | None = Query(None, description="ID продавца для фильтрации"),
+                          search_mode: SearchMode = Query(
+                              "auto", description="Режим поиска: auto (полнотекстовый с запасным триграммным), fts или trigram"),
+                          db: AsyncSession = Depends(get_async_db)):
+    """
+    Потоково выгружает активные товары в NDJSON или CSV с теми же фильтрами, что и GET /products/.
+    Товары идут в порядке id; ответ отдаётся частями по мере чтения из базы.
+    """
+    filters = await _build_product_filters(db, category_id, include_subcategories,
+                                           min_price, max_price, in_stock, seller_id)
+    search_value = search.strip() if search else None
+    if search_value:
+        filters.append((await build_search_clause(db, search_value, search_mode, filters)).filter)
+
+    return StreamingResponse(
+        stream_products(filters, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="products.{export_format}"'},
+    )
 
 @router.get('/category/{category_id}', status_code=status.HTTP_200_OK, response_model=list[ProductResponse])
 async def get_products_by_category(category_id: int, db: AsyncSession = Depends(get_async_db)):
@@ -157,20 +321,15 @@ async def get_products_by_category(category_id: int, db: AsyncSession = Depends(
     Возвращает список товаров в указанной категории по её ID.
     """
     # Проверяем, существует ли активная категория
-    result = await db.scalars(
-        select(CategoryModel).where(CategoryModel.id == category_id,
-                                    CategoryModel.is_active == True)
-    )
-    category = result.first()
-    if not category:
+    if not await is_category_active(db, category_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found or inactive")
 
-    # Получаем активные товары в категории
-    product_result = await db.scalars(
-        select(ProductModel).where(ProductModel.category_id == category_id,
-                                   ProductModel.is_active == True)
+    # Получаем активные товары в категории: только колонки ответа, без ORM-объектов
+    product_result = await db.execute(
+        select(*PRODUCT_RESPONSE_COLUMNS).where(ProductModel.category_id == category_id,
+                                                ProductModel.is_active == True)
     )
-    return product_result.all()
+    return json_response([dict(row) for row in product_result.mappings()], list[ProductResponse])
 
 
 @router.get('/{product_id}', status_code=status.HTTP_200_OK, response_model=ProductResponse)
@@ -179,11 +338,8 @@ async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db))
     """
     Возвращает детальную информацию о товаре по его ID.
     """
-    # Проверяем, существует ли активный товар
-    result = await db.scalars(
-        select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True)
-    )
-    product = result.first()
+    # Проверяем, существует ли активный товар (через кэш карточек)
+    product = await get_active_product(db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -191,14 +347,9 @@ async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db))
         )
 
     # Проверяем, существует ли активная категория
-    result = await db.scalars(
-        select(CategoryModel).where(CategoryModel.id == product.category_id,
-                                    CategoryModel.is_active == True)
-    )
-    category = result.first()
-    if not category:
+    if not await is_category_active(db, product["category_id"]):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
-    return product
+    return json_response(product, ProductResponse)
 
 @router.post('/', response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
@@ -210,12 +361,7 @@ async def create_product(
     Создаёт новый товар, привязанный к текущему продавцу (только для 'seller').
     """
     # Проверяем, существует ли активная категория
-
-    category_result = await db.scalars(
-        select(CategoryModel).where(CategoryModel.id == product.category_id,
-                                    CategoryModel.is_active == True)
-    )
-    if not category_result.first():
+    if not await is_category_active(db, product.category_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="Category not found or inactive")
 
@@ -230,8 +376,30 @@ async def create_product(
     db.add(db_product)
     await db.commit()
     await db.refresh(db_product) # Для получения id и is_active из базы
+    # Уменьшенные копии изображения готовятся в фоне
+    if image_url:
+        await schedule_image_variants(db_product.id, image_url)
     return db_product
 
+@router.post('/import', response_model=ProductImportReport, status_code=status.HTTP_200_OK)
+async def import_products_file(
+        file: UploadFile = File(..., description="CSV с заголовком или NDJSON (по объекту ProductCreate в строке)"),
+        file_format: ImportFormat | None = Query(
+            None, alias="format", description="Формат файла; по умолчанию определяется по имени и Content-Type"),
+        db: AsyncSession = Depends(get_async_db),
+        current_user: UserModel = Depends(get_current_seller)):
+    """
+    Массово создаёт товары текущего продавца из CSV или NDJSON (только для 'seller').
+    Строки обрабатываются пачками, каждая пачка фиксируется отдельной транзакцией.
+    Возвращает число созданных товаров и ошибки по строкам; если файл не удалось
+    дочитать (кодировка, повреждённый CSV), отчёт частичный и completed=False.
+    """
+    file_format = file_format or detect_format(file.filename, file.content_type)
+    if file_format is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Unknown file format, pass format=csv or format=ndjson")
+    return await import_products(db, file.file, file_format, seller_id=current_user.id)
+
 @router.put('/{product_id}', status_code=status.HTTP_200_OK, response_model=ProductResponse)
 async def update_product(
         product_id: int, product: ProductCreate = Depends(ProductCreate.as_form),
@@ -251,24 +419,35 @@ async def update_product(
     if db_product.seller_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only update your own products")
     # Проверяем, существует ли активная категория
-    category_result = await db.scalars(
-        select(CategoryModel).where(CategoryModel.id == product.category_id,
-                                    CategoryModel.is_active == True)
-    )
-    if not category_result.first():
+    if not await is_category_active(db, product.category_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
 
+    # Сначала сохраняем и проверяем новое изображение: если его отклонят,
+    # товар остаётся со старым файлом
+    old_image_url, old_variants = db_product.image_url, db_product.image_variants
+    new_image_url = await save_product_image(image) if image else None
+
     # Обновляем товар
     await db.execute(
         update(ProductModel).where(ProductModel.id == product_id).values(**product.model_dump())
     )
 
-    if image:
-        remove_product_image(db_product.image_url)
-        db_product.image_url = await save_product_image(image)
-
-    await db.commit()
+    if new_image_url:
+        db_product.image_url = new_image_url
+        db_product.image_variants = None
+
+    try:
+        await db.commit()
+    except BaseException:
+        await remove_product_image(new_image_url)
+        raise
+    # Старые файлы удаляем только после успешного commit
+    if new_image_url:
+        await remove_product_image(old_image_url, old_variants)
+    await invalidate_product(product_id)
     await db.refresh(db_product)
+    if new_image_url:
+        await schedule_image_variants(product_id, db_product.image_url)
     return db_product
 
 @router.delete('/{product_id}', status_code=status.HTTP_200_OK)
@@ -299,9 +478,10 @@ async def delete_product(
     await db.execute(
         update(ProductModel).where(ProductModel.id == product_id).values(is_active=False)
     )
-    remove_product_image(product.image_url)
+    await remove_product_image(product.image_url, product.image_variants)
 
     await db.commit()
+    await invalidate_product(product_id)
     await db.refresh(product)
     return product
 
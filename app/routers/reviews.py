@@ -1,56 +1,84 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from datetime import datetime
+from decimal import Decimal
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db_depends import get_async_db
-from sqlalchemy import select, update, func
+from sqlalchemy import select, update, tuple_
 from app.models.reviews import Reviews as ReviewsModel
 from app.auth import get_current_buyer, get_current_admin
 from app.models.users import User as UserModel
-from app.schemas import ReviewCreate, ReviewResponse
-from app.models import Product as ProductModel
+from app.schemas import ReviewCreate, ReviewResponse, ReviewList
+from app.catalog_cache import get_active_product
+from app.ratings import add_review_grade, remove_review_grade
+from app.pagination import encode_cursor, decode_cursor
 
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
-async def recalculate_product_rating(db: AsyncSession, product_id: int):
+ReviewSort = Literal["newest", "highest"]
+
+async def _review_page(db: AsyncSession, filters: list, sort: ReviewSort,
+                       page_size: int, cursor: str | None) -> ReviewList:
     """
-    Пересчитывает средний рейтинг товара на основе активных отзывов.
+    Выбирает страницу активных отзывов по ключу (comment_date, id) или (grade, id)
+    в порядке убывания. Запрос идёт по частичным индексам ix_reviews_* и не зависит
+    от того, насколько далеко пролистан список.
     """
-    result = await db.execute(
-        select(func.avg(ReviewsModel.grade))
-        .where(ReviewsModel.product_id == product_id, ReviewsModel.is_active == True)
-    )
-    avg_rating = result.scalar()
-
-    new_rating = float(avg_rating) if avg_rating is not None else 0.0
-
-    await db.execute(
-        update(ProductModel)
-        .where(ProductModel.id == product_id)
-        .values(rating=new_rating)  # Убедитесь, что поле называется `rating`, а не `ratting`
+    sort_column = ReviewsModel.comment_date if sort == "newest" else ReviewsModel.grade
+    stmt = (
+        select(ReviewsModel)
+        .where(ReviewsModel.is_active == True, *filters)
+        .order_by(sort_column.desc(), ReviewsModel.id.desc())
     )
-    await db.commit()
-
-
-@router.get("/", response_model=list[ReviewResponse], status_code=status.HTTP_200_OK)
-async def get_reviews(db: AsyncSession = Depends(get_async_db)):
+    if cursor is not None:
+        last = decode_cursor(cursor, sort=str, key=str, id=int)
+        if last["sort"] != sort:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        try:
+            last_key = datetime.fromisoformat(last["key"]) if sort == "newest" else Decimal(last["key"])
+        except (TypeError, ValueError, ArithmeticError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(sort_column, ReviewsModel.id) < tuple_(last_key, last["id"]))
+
+    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+    reviews = (await db.scalars(stmt.limit(page_size + 1))).all()
+    next_cursor = None
+    if len(reviews) > page_size:
+        reviews = reviews[:page_size]
+        last_review = reviews[-1]
+        last_key = last_review.comment_date.isoformat() if sort == "newest" else str(last_review.grade)
+        next_cursor = encode_cursor({"sort": sort, "key": last_key, "id": last_review.id})
+    return ReviewList(items=reviews, page_size=page_size, next_cursor=next_cursor)
+
+
+@router.get("/", response_model=ReviewList, status_code=status.HTTP_200_OK)
+async def get_reviews(sort: ReviewSort = Query("newest", description="Порядок: newest — новые сначала, highest — по оценке"),
+                      page_size: int = Query(20, ge=1, le=100),
+                      cursor: str | None = Query(
+                          None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+                      db: AsyncSession = Depends(get_async_db)):
     """
-    Возвращает список всех отзывов.
+    Возвращает страницу активных отзывов.
     """
-    result = await db.scalars(select(ReviewsModel).where(ReviewsModel.is_active == True))
-    return result.all()
-
-@router.get("/product/{product_id}/reviews", response_model=list[ReviewResponse], status_code=status.HTTP_200_OK)
-async def get_product_reviews(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await _review_page(db, [], sort, page_size, cursor)
+
+@router.get("/product/{product_id}/reviews", response_model=ReviewList, status_code=status.HTTP_200_OK)
+async def get_product_reviews(product_id: int,
+                              sort: ReviewSort = Query("newest", description="Порядок: newest — новые сначала, highest — по оценке"),
+                              page_size: int = Query(20, ge=1, le=100),
+                              cursor: str | None = Query(
+                                  None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+                              db: AsyncSession = Depends(get_async_db)):
     """
-    Возвращает список отзывов по конкретному продукту.
+    Возвращает страницу отзывов по конкретному продукту.
     """
-    # Проверяем, существует ли активный продукт с указанным ID
-    result = await db.scalars(select(ReviewsModel).where(ReviewsModel.product_id == product_id, ReviewsModel.is_active == True))
-    product_reviews = result.all()
-    if not product_reviews:
+    page = await _review_page(db, [ReviewsModel.product_id == product_id], sort, page_size, cursor)
+    if not page.items and cursor is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reviews for the product not found or inactive")
-    return product_reviews
+    return page
 
 
 @router.post("/", response_model=ReviewResponse, status_code=status.HTTP_201_CREATED)
@@ -59,18 +87,11 @@ async def create_review(review_data: ReviewCreate,
                         current_user: UserModel = Depends(get_current_buyer)):
     """
     Добавляет отзыв на товар (только для 'buyer').
-    Пересчитывает средний рейтинг товара после добавления отзыва.
+    Оценка добавляется к агрегатам рейтинга товара в той же транзакции.
     """
     # Проверяем, существует ли активный товар
-    result = await db.scalars(select(ReviewsModel).where(ReviewsModel.product_id == review_data.product_id, ReviewsModel.is_active == True))
-    product_reviews = result.first()
-    if product_reviews.role != "buyer":
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only buyers can leave reviews")
-    if not product_reviews:
+    if await get_active_product(db, review_data.product_id) is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
-    # Проверяем, что оценка в диапазоне 1–5
-    if not 1 <= review_data.rating <= 5:
-        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail="Rating must be between 1 and 5")
     # Создаём отзыв
     db_review = ReviewsModel(
         user_id=current_user.id,
@@ -80,10 +101,11 @@ async def create_review(review_data: ReviewCreate,
         is_active=True
     )
     db.add(db_review)
+    await db.flush()
+    # Обновляем рейтинг товара инкрементально
+    await add_review_grade(db, review_data.product_id, review_data.grade)
     await db.commit()
     await db.refresh(db_review)
-    # Пересчитываем средний рейтинг товара
-    await recalculate_product_rating(db, review_data.product_id)
     return db_review
 
 
@@ -92,26 +114,21 @@ async def delete_review(review_id: int,
                         db: AsyncSession = Depends(get_async_db),
                         current_user: UserModel = Depends(get_current_admin)):
     """
-    Мягко удаляет отзыв (только для админа). Пересчитывает рейтинг товара.
+    Мягко удаляет отзыв (только для админа).
+    Оценка вычитается из агрегатов рейтинга товара в той же транзакции.
     """
-    # Мягкое удаление
-    # Находим отзыв
-    result = await db.scalars(
-        select(ReviewsModel).where(ReviewsModel.id == review_id, ReviewsModel.is_active == True)
-    )
-    review = result.first()
-    if not review:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found or already inactive")
-
-    # Мягкое удаление
-    await db.execute(
+    # Мягкое удаление; условие is_active защищает от двойного вычитания оценки
+    review = (await db.execute(
         update(ReviewsModel)
-        .where(ReviewsModel.id == review_id)
+        .where(ReviewsModel.id == review_id, ReviewsModel.is_active == True)
         .values(is_active=False)
-    )
-    await db.commit()
+        .returning(ReviewsModel.product_id, ReviewsModel.grade)
+        .execution_options(synchronize_session=False)
+    )).first()
+    if review is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found or already inactive")
 
-    # Пересчёт рейтинга товара после удаления отзыва
-    await recalculate_product_rating(db, review.product_id)
+    await remove_review_grade(db, review.product_id, review.grade)
+    await db.commit()
 
-    return {"message": "Review deleted successfully"}
\ No newline at end of file
+    return {"message": "Review deleted successfully"}
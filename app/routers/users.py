@@ -2,13 +2,14 @@ import jwt
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from loguru import logger
 from app.config import SECRET_KEY, ALGORITHM
 from app.models.users import User as UserModel
 from app.schemas import UserCreate, UserResponse
 from app.db_depends import get_async_db
-from app.auth import hash_password, verify_password, create_access_token, create_refresh_token
+from app.auth import (password_hasher, create_access_token, create_refresh_token,
+                      get_current_admin, invalidate_principal)
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -34,8 +35,9 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered")
     # Создание объекта пользователя с хешированным паролем
     db_user = UserModel(
+        name=user.name,
         email=user.email,
-        hashed_password=hash_password(user.password),
+        hashed_password=await password_hasher.hash(user.password),
         role=user.role
     )
 
@@ -55,12 +57,18 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(),
     result = await db.scalars(
         select(UserModel).where(UserModel.email == form_data.username, UserModel.is_active == True))
     user = result.first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = (await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+                          if user else (False, None))
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Стоимость bcrypt изменилась — сохраняем пароль с новым хешем
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     access_token = create_access_token(data={"sub": user.email, "role": user.role, "id": user.id})
     refresh_token = create_refresh_token(data={"sub": user.email, "role": user.role, "id": user.id})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
@@ -88,3 +96,21 @@ async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_async
         raise credentials_exception
     access_token = create_access_token(data={"sub": user.email, "role": user.role, "id": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
+
+
+@router.patch("/{user_id}/deactivate", response_model=UserResponse)
+async def deactivate_user(user_id: int,
+                          db: AsyncSession = Depends(get_async_db),
+                          current_user: UserResponse = Depends(get_current_admin)):
+    """
+    Деактивирует пользователя (только для 'admin') и удаляет его из кэша авторизации.
+    """
+    result = await db.scalars(select(UserModel).where(UserModel.id == user_id))
+    user = result.first()
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    await db.execute(update(UserModel).where(UserModel.id == user_id).values(is_active=False))
+    await db.commit()
+    await invalidate_principal(user_id)
+    await db.refresh(user)
+    return user
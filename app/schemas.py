@@ -1,8 +1,8 @@
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 from fastapi import Form
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, model_validator
 from decimal import Decimal
 
 from typing import Annotated
@@ -31,16 +31,27 @@ class CategoryResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CategoryTreeNode(BaseModel):
+    """
+    Узел дерева активных категорий.
+    """
+    id: int = Field(description="ID категории")
+    name: str = Field(description="Название категории")
+    parent_id: int | None = Field(None, description="ID родительской категории, если есть")
+    children: list["CategoryTreeNode"] = Field(default_factory=list, description="Дочерние категории")
+
+
 class ProductCreate(BaseModel):
     """
     Модель для создания и обновления товара.
     Используется в POST и PUT запросах.
     """
-    name: str = Field(..., min_length=3, max_length=110,
-                      description="Название товара (от 3 до 110 символов)")
-    description: Optional[str] = Field(None, max_length=555,
-                                    description="Описание товара (не более 555 символов)")
-    price: Decimal = Field(gt=0, description="Цена товара (больше 0)", decimal_places=2)
+    # Ограничения совпадают с колонками products: String(100), String(500), Numeric(10, 2)
+    name: str = Field(..., min_length=3, max_length=100,
+                      description="Название товара (от 3 до 100 символов)")
+    description: Optional[str] = Field(None, max_length=500,
+                                    description="Описание товара (не более 500 символов)")
+    price: Decimal = Field(gt=0, description="Цена товара (больше 0)", max_digits=10, decimal_places=2)
     stock: int = Field(..., gt=0, description="Количество товара на складе (0 или больше)")
     category_id: int = Field(..., description="ID категории, к которой относится товар")
 
@@ -62,6 +73,16 @@ class ProductCreate(BaseModel):
         )
 
 
+class ImageVariant(BaseModel):
+    """
+    Уменьшенная копия изображения товара.
+    """
+    width: int = Field(description="Ширина в пикселях")
+    height: int = Field(description="Высота в пикселях")
+    webp: str = Field(description="URL в формате WebP")
+    jpeg: str = Field(description="URL в формате JPEG")
+
+
 class ProductResponse(BaseModel):
     """
     Модель для ответа с данными товара.
@@ -72,6 +93,8 @@ class ProductResponse(BaseModel):
     description: Optional[str] = Field(None, description="Описание товара")
     price: Decimal = Field(description="Цена товара", gt=0, decimal_places=2)
     image_url: Optional[str] = Field(None, description="URL на изображение товара")
+    image_variants: dict[str, ImageVariant] | None = Field(
+        None, description="Уменьшенные копии изображения (thumb, card, large); появляются после обработки")
     stock: int = Field(description="Количество товара на складе")
     category_id: int = Field(description="ID категории, к которой относится товар")
     is_active: bool = Field(description="Активен ли товар")
@@ -79,6 +102,26 @@ class ProductResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ProductImportError(BaseModel):
+    """
+    Ошибка импорта одной строки файла.
+    """
+    row: int = Field(description="Номер строки в файле")
+    error: str = Field(description="Описание ошибки")
+
+
+class ProductImportReport(BaseModel):
+    """
+    Результат массового импорта товаров.
+    """
+    created: int = Field(ge=0, description="Количество созданных товаров")
+    failed: int = Field(ge=0, description="Количество строк с ошибками")
+    errors: list[ProductImportError] = Field(description="Ошибки по строкам")
+    errors_truncated: bool = Field(False, description="Список ошибок обрезан до IMPORT_MAX_REPORTED_ERRORS")
+    completed: bool = Field(True, description="Файл обработан целиком; False — чтение остановлено "
+                                              "ошибкой кодировки или разбора (см. последнюю ошибку)")
+
+
 class UserCreate(BaseModel):
     name: str = Field(min_length=4, description="Имя пользователя (минимум 4 символа)")
     email: EmailStr = Field(description="Email пользователя")
@@ -110,14 +153,23 @@ class ReviewResponse(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class ReviewList(BaseModel):
+    """
+    Страница отзывов с пагинацией по ключу.
+    """
+    items: list[ReviewResponse] = Field(description="Отзывы на текущей странице")
+    page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, None если страница последняя")
+
 class ProductList(BaseModel):
     """
     Список пагинации для товаров.
     """
     items: list[ProductResponse] = Field(description="Товары для текущей страницы")
-    total: int = Field(ge=0, description="Общее количество товаров")
+    total: int | None = Field(None, ge=0, description="Общее количество товаров (оценка или None в зависимости от режима count; None при переходе по cursor)")
     page: int = Field(ge=1, description="Текущая страница")
     page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, None если страница последняя")
 
     model_config = ConfigDict(from_attributes=True) # Для чтения из ORM-объектов
 
@@ -136,6 +188,25 @@ class CartItemUpdate(BaseModel):
     """Модель для обновления количества товара в корзине."""
     quantity: int = Field(..., ge=1, description="Новое количество товара")
 
+class CartBatchOperation(BaseModel):
+    """Одна операция пакетного изменения корзины."""
+    op: Literal["add", "set", "remove"] = Field(
+        description="add — увеличить количество, set — установить количество, remove — убрать товар")
+    product_id: int = Field(description="ID товара")
+    quantity: int | None = Field(None, ge=1, description="Количество (для add и set)")
+
+    @model_validator(mode="after")
+    def check_quantity(self) -> "CartBatchOperation":
+        if self.op != "remove" and self.quantity is None:
+            raise ValueError(f"quantity is required for '{self.op}'")
+        return self
+
+
+class CartBatchRequest(BaseModel):
+    """Список операций над корзиной, применяемых в одной транзакции по порядку."""
+    operations: list[CartBatchOperation] = Field(min_length=1, max_length=200, description="Операции")
+
+
 class CartItem(BaseModel):
     """Товар в корзине с данными продукта."""
     id: int = Field(..., description="ID позиции корзины")
@@ -181,8 +252,9 @@ class OrderResponse(BaseModel):
 class OrderList(BaseModel):
     '''Модель для списка заказов'''
     items: list[OrderResponse] = Field(..., description="Заказы на текущей странице")
-    total: int = Field(ge=0, description="Общее количество заказов")
+    total: int | None = Field(None, ge=0, description="Общее количество заказов (не считается при выборке по cursor)")
     page: int = Field(ge=1, description="Текущая страница")
     page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, None если страница последняя")
 
     model_config = ConfigDict(from_attributes=True)
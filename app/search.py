@@ -0,0 +1,58 @@
+from typing import Literal, NamedTuple
+
+from sqlalchemy import exists, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.products import Product as ProductModel
+
+
+SearchMode = Literal["auto", "fts", "trigram"]
+
+
+class SearchClause(NamedTuple):
+    """
+    Условие поиска и выражение ранга для сортировки результатов.
+    """
+    filter: object
+    rank: object
+
+
+def fulltext_clause(value: str) -> SearchClause:
+    """
+    Полнотекстовый поиск по tsv (индекс ix_product_tsv_gin).
+    """
+    ts_query = func.websearch_to_tsquery('english', value)
+    return SearchClause(
+        filter=ProductModel.tsv.op('@@')(ts_query),
+        rank=func.ts_rank_cd(ProductModel.tsv, ts_query).label('rank'),
+    )
+
+
+def trigram_clause(value: str) -> SearchClause:
+    """
+    Поиск по подстроке и с опечатками через pg_trgm (индекс ix_product_name_trgm).
+    ILIKE и оператор % используют один и тот же триграммный GIN-индекс.
+    """
+    escaped = value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    return SearchClause(
+        filter=or_(ProductModel.name.ilike(f"%{escaped}%", escape="!"),
+                   ProductModel.name.op('%')(value)),
+        rank=func.similarity(ProductModel.name, value).label('rank'),
+    )
+
+
+async def build_search_clause(db: AsyncSession, value: str, mode: SearchMode,
+                              filters: list) -> SearchClause:
+    """
+    Выбирает стратегию поиска.
+    В режиме auto используется полнотекстовый индекс, а если по нему с учётом
+    остальных фильтров ничего не найдено — триграммный поиск.
+    """
+    if mode == "fts":
+        return fulltext_clause(value)
+    if mode == "trigram":
+        return trigram_clause(value)
+
+    clause = fulltext_clause(value)
+    found = await db.scalar(select(exists().where(*filters, clause.filter)))
+    return clause if found else trigram_clause(value)
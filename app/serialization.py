@@ -0,0 +1,36 @@
+"""
+Быстрая сериализация ответов.
+
+Обычный путь FastAPI для response_model: валидация модели, model_dump(mode="json")
+в промежуточный dict и затем json.dumps в JSONResponse. Здесь ответ проверяется
+заранее созданным TypeAdapter (схема и сериализатор компилируются один раз на тип)
+и сразу пишется в JSON-байты pydantic-core, без промежуточного dict.
+
+Сборка моделей через model_construct без валидации здесь не используется:
+по benchmarks/serialization.py она медленнее валидации в pydantic-core,
+так как обход полей выполняется в Python.
+"""
+from functools import lru_cache
+from typing import Any
+
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+
+@lru_cache(maxsize=None)
+def type_adapter(annotation: Any) -> TypeAdapter:
+    """
+    TypeAdapter, создаваемый один раз на тип: схема и сериализатор компилируются заранее.
+    """
+    return TypeAdapter(annotation)
+
+
+def json_response(value: Any, annotation: Any, status_code: int = 200) -> Response:
+    """
+    Проверяет значение (словарь, ORM-объект или их списки) по схеме ответа и возвращает
+    готовый JSON-ответ. FastAPI не обрабатывает возвращённый Response повторно,
+    response_model у маршрута остаётся для документации.
+    """
+    adapter = type_adapter(annotation)
+    content = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    return Response(content, status_code=status_code, media_type="application/json")
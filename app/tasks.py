@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+from celery import Celery, Task
+from celery.result import AsyncResult
+from loguru import logger
+
+from app.config import settings
+
+
+def create_celery(eager: bool = settings.CELERY_TASK_ALWAYS_EAGER) -> Celery:
+    """
+    Создаёт приложение Celery. В режиме eager задачи выполняются сразу
+    в вызывающем процессе, а брокер и бэкенд результатов живут в памяти.
+    """
+    if eager:
+        broker, backend = "memory://", "cache+memory://"
+    else:
+        broker = backend = settings.CELERY_BROKER_URL or settings.REDIS_URL
+    app = Celery(
+        "app",
+        broker=broker,
+        backend=backend,
+        broker_connection_retry_on_startup=True,
+    )
+    app.conf.update(
+        task_always_eager=eager,
+        task_eager_propagates=True,
+        task_ignore_result=True,
+        task_serializer="json",
+        accept_content=["json"],
+    )
+    if settings.CART_BACKEND == "redis":
+        # Периодический сброс корзин из Redis в базу (celery beat)
+        app.conf.beat_schedule = {
+            "flush-carts": {"task": "app.tasks.flush_carts", "schedule": settings.CART_FLUSH_BEAT_INTERVAL},
+        }
+    return app
+
+
+celery = create_celery()
+
+
+async def dispatch(task: Task, *args, **kwargs) -> AsyncResult:
+    """
+    Ставит задачу в очередь Celery из async-кода.
+    Публикация в брокер выполняется в потоке, чтобы не блокировать цикл событий.
+    """
+    return await asyncio.to_thread(task.apply_async, args=args, kwargs=kwargs)
+
+
+@celery.task(name="app.tasks.call_background_task")
+def call_background_task(message: str, delay_seconds: float = settings.BACKGROUND_TASK_DELAY) -> None:
+    time.sleep(delay_seconds)
+    logger.info({"event": "background_task", "message": message})
+
+
+@celery.task(name="app.tasks.generate_image_variants")
+def generate_image_variants(product_id: int, image_url: str) -> None:
+    """
+    Генерирует производные изображения товара и сохраняет их в image_variants.
+    При CACHE_BACKEND=redis карточка товара сразу удаляется из общего кэша; in-process
+    кэши веб-процессов воркеру недоступны и получат варианты по истечении CATALOG_CACHE_TTL.
+    Воркеру нужен тот же каталог media, что и приложению (общий том в docker-compose.yml).
+    """
+    from redis import asyncio as aioredis
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    from app.cache import RedisCache
+    from app.catalog_cache import PRODUCT_CACHE_NAMESPACE
+    from app.images import build_variants, media_path, store_variants
+
+    source = media_path(image_url)
+    if not source.is_file():
+        # Исходник мог быть уже заменён новым изображением; иначе каталог media не общий с приложением
+        logger.error({"event": "image_variants_source_missing", "product_id": product_id,
+                      "path": str(source)})
+        return
+
+    variants = build_variants(image_url)
+
+    async def store() -> bool:
+        # Отдельный движок без пула: каждый вызов задачи работает в своём цикле событий
+        engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool)
+        try:
+            async with AsyncSession(engine) as db:
+                stored = await store_variants(db, product_id, image_url, variants)
+        finally:
+            await engine.dispose()
+        if stored and settings.CACHE_BACKEND == "redis":
+            # Свой клиент Redis: общий клиент приложения привязан к другому циклу событий
+            client = aioredis.Redis.from_url(settings.REDIS_URL)
+            try:
+                await RedisCache(client, namespace=PRODUCT_CACHE_NAMESPACE).delete(str(product_id))
+            finally:
+                await client.aclose()
+        return stored
+
+    stored = asyncio.run(store())
+    logger.info({"event": "image_variants", "product_id": product_id, "stored": stored})
+
+
+@celery.task(name="app.tasks.flush_carts")
+def flush_carts() -> None:
+    """
+    Сбрасывает изменённые корзины из Redis в cart_items (при CART_BACKEND=redis).
+    Дублирует фоновый цикл приложения: корзины сохраняются, даже если веб-процессы остановлены.
+    """
+    if settings.CART_BACKEND != "redis":
+        return
+    from redis import asyncio as aioredis
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    from app.cart_store import RedisCartStore
+
+    async def flush() -> int:
+        # Свои движок и клиент Redis: каждый вызов задачи работает в своём цикле событий
+        engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool)
+        client = aioredis.Redis.from_url(settings.REDIS_URL)
+        try:
+            store = RedisCartStore(client)
+            return await store.flush_dirty(async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession))
+        finally:
+            await client.aclose()
+            await engine.dispose()
+
+    flushed = asyncio.run(flush())
+    logger.info({"event": "carts_flushed", "count": flushed})
@@ -0,0 +1,66 @@
+import asyncio
+
+from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.catalog_cache import category_cache, product_cache
+from app.models.categories import Category as CategoryModel, CATEGORY_RESPONSE_COLUMNS
+from app.models.products import Product as ProductModel, PRODUCT_RESPONSE_COLUMNS
+from app.schemas import ProductResponse
+
+
+def _hot_statements() -> list:
+    """
+    Запросы, которые выполняются почти на каждый запрос к API.
+    Их выполнение при старте заполняет кэш компиляции SQLAlchemy и
+    кэш подготовленных выражений asyncpg на каждом прогретом соединении.
+    Списки строятся из тех же кортежей колонок, что и в роутерах, чтобы SQL совпадал.
+    """
+    return [
+        select(ProductModel).where(ProductModel.id == 0, ProductModel.is_active == True),
+        select(CategoryModel.id).where(CategoryModel.id == 0, CategoryModel.is_active == True),
+        select(*PRODUCT_RESPONSE_COLUMNS).where(ProductModel.is_active == True)
+        .order_by(ProductModel.id).offset(0).limit(21),
+        select(func.count()).select_from(ProductModel).where(ProductModel.is_active == True),
+        select(*PRODUCT_RESPONSE_COLUMNS).where(ProductModel.category_id == 0, ProductModel.is_active == True),
+        select(*CATEGORY_RESPONSE_COLUMNS).where(CategoryModel.is_active == True),
+    ]
+
+
+async def warm_pool(engine: AsyncEngine, size: int) -> None:
+    """
+    Открывает size соединений одновременно и прогоняет на каждом горячие запросы,
+    чтобы первые запросы после деплоя не платили за подключение и подготовку выражений.
+    """
+    statements = _hot_statements()
+
+    async def warm_connection() -> None:
+        async with engine.connect() as conn:
+            for stmt in statements:
+                await conn.execute(stmt)
+
+    await asyncio.gather(*(warm_connection() for _ in range(size)))
+    logger.info({"event": "db_pool_warmed", "connections": size})
+
+
+async def prime_caches(db: AsyncSession, top_products: int) -> None:
+    """
+    Заполняет кэш активных категорий и карточек самых популярных товаров.
+    """
+    category_ids = (await db.scalars(
+        select(CategoryModel.id).where(CategoryModel.is_active == True)
+    )).all()
+    for category_id in category_ids:
+        await category_cache.set(str(category_id), True)
+
+    products = (await db.execute(
+        select(*PRODUCT_RESPONSE_COLUMNS)
+        .where(ProductModel.is_active == True)
+        .order_by(ProductModel.rating.desc().nulls_last(), ProductModel.id)
+        .limit(top_products)
+    )).mappings().all()
+    for product in products:
+        await product_cache.set(str(product["id"]), ProductResponse.model_validate(dict(product)).model_dump(mode="json"))
+
+    logger.info({"event": "caches_primed", "categories": len(category_ids), "products": len(products)})
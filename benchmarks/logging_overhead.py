@@ -0,0 +1,100 @@
+"""
+Бенчмарк: сколько пропускной способности стоит логирование запросов.
+
+Прогоняет запросы к минимальному FastAPI-приложению напрямую через ASGI
+(без сети) в нескольких режимах:
+  * off          — без middleware логирования;
+  * sync         — middleware, запись в файл прямо в цикле событий;
+  * enqueue      — middleware, запись через QueueSink (очередь и фоновый поток);
+  * enqueue+10%  — то же, логируется 10% успешных запросов.
+
+Запуск:
+    python -m benchmarks.logging_overhead --requests 20000 --concurrency 50
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+from fastapi import FastAPI
+from loguru import logger
+
+from app.config import settings
+from app.request_logging import QueueSink, RequestLoggingMiddleware
+
+
+def build_app(with_logging: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    if with_logging:
+        app.add_middleware(RequestLoggingMiddleware)
+    return app
+
+
+async def call(app: FastAPI) -> None:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/ping", "raw_path": b"/ping",
+        "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def run(app: FastAPI, total: int, concurrency: int) -> float:
+    queue = iter(range(total))
+
+    async def worker():
+        for _ in queue:
+            await call(app)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def main(total: int, concurrency: int) -> None:
+    log_file = tempfile.NamedTemporaryFile(suffix=".log", delete=False).name
+    modes = [
+        ("off", False, False, 1.0),
+        ("sync", True, False, 1.0),
+        ("enqueue", True, True, 1.0),
+        ("enqueue+10%", True, True, 0.1),
+    ]
+    baseline = None
+    for name, with_logging, enqueue, sample_rate in modes:
+        logger.remove()
+        stream = open(log_file, "a")
+        sink = QueueSink(stream) if enqueue else None
+        sink_id = logger.add(sink.write if sink else stream, format="{message}", serialize=True)
+        settings.LOG_SUCCESS_SAMPLE_RATE = sample_rate
+
+        app = build_app(with_logging)
+        await run(app, min(total, 1000), concurrency)  # прогрев
+        rps = await run(app, total, concurrency)
+        logger.remove(sink_id)
+        if sink:
+            sink.stop()  # дожидается опустошения очереди
+        stream.close()
+
+        baseline = baseline or rps
+        print(f"{name:>12}: {rps:10.0f} req/s  ({rps / baseline:6.1%} of off)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,71 @@
+"""
+Бенчмарк проверки паролей при конкурентных входах.
+
+Сравнивает синхронный verify прямо в цикле событий (как было в login) с
+PasswordHasher (ограниченный пул потоков + семафор). Кроме пропускной
+способности измеряет, насколько «замирает» цикл событий: фоновая корутина
+тикает каждые 5 мс, и фиксируется максимальная задержка её пробуждения.
+
+Запуск:
+    python -m benchmarks.login_throughput --logins 200 --concurrency 50 --rounds 10
+"""
+import argparse
+import asyncio
+import time
+
+from passlib.context import CryptContext
+
+from app.auth import PasswordHasher
+
+
+async def ticker(stop: asyncio.Event, lags: list[float], interval: float = 0.005) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def run(verify, logins: int, concurrency: int) -> tuple[float, float]:
+    stop = asyncio.Event()
+    lags: list[float] = []
+    tick = asyncio.create_task(ticker(stop, lags))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            await verify()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    return logins / elapsed, max(lags, default=0.0)
+
+
+async def main(logins: int, concurrency: int, rounds: int, workers: int) -> None:
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    hashed = context.hash("correct horse battery staple")
+
+    async def sync_verify():
+        context.verify("correct horse battery staple", hashed)
+
+    hasher = PasswordHasher(context, max_workers=workers, max_concurrency=workers * 2)
+
+    async def pooled_verify():
+        await hasher.verify_and_update("correct horse battery staple", hashed)
+
+    for name, verify in (("sync in loop", sync_verify), (f"pool x{workers}", pooled_verify)):
+        rps, max_lag = await run(verify, logins, concurrency)
+        print(f"{name:>14}: {rps:8.1f} logins/s, max event loop lag {max_lag:8.1f} ms")
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency, args.rounds, args.workers))
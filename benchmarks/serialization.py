@@ -0,0 +1,120 @@
+"""
+Бенчмарк сериализации ответов: обычный путь response_model против быстрого.
+
+Данные имитируют страницу из page_size товаров, корзину и заказ с page_size
+позициями; вместо ORM-объектов используются объекты с атрибутами. Режимы:
+  * validate        — как FastAPI для response_model: model_validate(from_attributes),
+                      model_dump(mode="json") и json.dumps (JSONResponse);
+  * validate+orjson — то же, но ответ рендерится orjson (ORJSONResponse);
+  * construct       — model_construct без валидации (рекурсивно) и TypeAdapter.dump_json;
+  * adapter         — app/serialization.py: валидация заранее созданным TypeAdapter
+                      и dump_json сразу в байты, без промежуточного dict.
+
+Запуск:
+    python -m benchmarks.serialization --page-size 100 --repeat 300
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace, UnionType
+from typing import get_args, get_origin
+
+import orjson
+from pydantic import BaseModel
+
+from app.schemas import CartResponse, OrderResponse, ProductList
+from app.serialization import json_response, type_adapter
+
+
+def make_product(product_id: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=product_id, name=f"Product {product_id}", description="Описание товара " * 5,
+        price=Decimal("1999.90"), image_url=f"/media/product/{product_id}.jpg",
+        image_variants={"thumb": {"width": 160, "height": 120, "webp": f"/media/product/{product_id}-thumb.webp",
+                                  "jpeg": f"/media/product/{product_id}-thumb.jpg"}},
+        stock=10, category_id=1, is_active=True,
+    )
+
+
+def make_payloads(page_size: int) -> dict[str, tuple[type, object]]:
+    products = [make_product(i) for i in range(1, page_size + 1)]
+    now = datetime.now(timezone.utc)
+    return {
+        "ProductList": (ProductList, SimpleNamespace(
+            items=products, total=10_000, page=1, page_size=page_size, next_cursor="eyJpZCI6MTAwfQ")),
+        "CartResponse": (CartResponse, SimpleNamespace(
+            user_id=1,
+            items=[SimpleNamespace(id=p.id, quantity=2, product=p) for p in products],
+            total_quantity=2 * page_size, total_price=Decimal("1999.90") * 2 * page_size)),
+        "OrderResponse": (OrderResponse, SimpleNamespace(
+            id=1, user_id=1, status="pending", total_amount=Decimal("1999.90") * page_size,
+            created_at=now, updated_at=now,
+            items=[SimpleNamespace(id=p.id, product_id=p.id, quantity=1, unit_price=p.price,
+                                   total_price=p.price, product=p) for p in products])),
+    }
+
+
+def validate_json(model, data) -> bytes:
+    content = model.model_validate(data, from_attributes=True).model_dump(mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def validate_orjson(model, data) -> bytes:
+    return orjson.dumps(model.model_validate(data, from_attributes=True).model_dump(mode="json"))
+
+
+def construct(model, data):
+    values = {}
+    for name, field in model.model_fields.items():
+        value = getattr(data, name, None)
+        annotation = field.annotation
+        if get_origin(annotation) is UnionType:
+            annotation = get_args(annotation)[0]
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel) and value is not None:
+            value = construct(annotation, value)
+        elif get_origin(annotation) is list and value is not None:
+            value = [construct(get_args(annotation)[0], item) for item in value]
+        elif get_origin(annotation) is dict and value is not None:
+            value = {key: construct(get_args(annotation)[1], item) for key, item in value.items()}
+        values[name] = value
+    return model.model_construct(**values)
+
+
+def construct_json(model, data) -> bytes:
+    return type_adapter(model).dump_json(construct(model, data))
+
+
+def adapter(model, data) -> bytes:
+    return json_response(data, model).body
+
+
+def measure(func, model, data, repeat: int) -> float:
+    func(model, data)  # прогрев (компиляция TypeAdapter)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(model, data)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(page_size: int, repeat: int) -> None:
+    modes = [("validate", validate_json), ("validate+orjson", validate_orjson),
+             ("construct", construct_json), ("adapter", adapter)]
+    for name, (model, data) in make_payloads(page_size).items():
+        # Оба пути должны давать один и тот же JSON
+        assert json.loads(adapter(model, data)) == json.loads(validate_json(model, data)), name
+        baseline = None
+        print(f"{name} ({page_size} items):")
+        for mode, func in modes:
+            ms = measure(func, model, data, repeat)
+            baseline = baseline or ms
+            print(f"  {mode:>16}: {ms:8.3f} ms/response  (x{baseline / ms:4.1f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+    main(args.page_size, args.repeat)